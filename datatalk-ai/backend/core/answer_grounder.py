@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from core.nvidia_client import nvidia_complete, has_api_key
+from core.number_index import NumberIndex, mark_unverified
 
 PROMPT_PATH = Path(__file__).parent.parent / "prompts" / "answer_grounding.txt"
 
@@ -29,7 +30,11 @@ Data:
 Provide a direct, factual answer based strictly on the data above:"""
 
         answer = nvidia_complete(system_prompt, user_message, max_tokens=600, temperature=0.3)
-        return answer if answer else self._fallback_answer(question, result_df)
+        return self.verify(answer, result_df) if answer else self._fallback_answer(question, result_df)
+
+    def verify(self, answer, result_df):
+        """Tag numbers in the answer that cannot be traced back to the result."""
+        return mark_unverified(answer, NumberIndex.from_frame(result_df))
 
     def _fallback_answer(self, question, result_df):
         if result_df is None or result_df.empty:
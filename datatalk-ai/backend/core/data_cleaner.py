@@ -1,65 +1,174 @@
+import os
+import re
+import duckdb
 import pandas as pd
+from typing import Dict, List
 
-def clean_column_names(df: pd.DataFrame) -> pd.DataFrame:
-    df.columns = (
-        df.columns
-        .str.strip()
-        .str.lower()
-        .str.replace(" ", "_")
-        .str.replace(r"[^a-zA-Z0-9_]", "", regex=True)
-    )
-    return df
-
-def clean_strings(df: pd.DataFrame) -> pd.DataFrame:
-    for col in df.select_dtypes(include='object').columns:
-        df[col] = df[col].astype(str).str.strip()
-    return df
-
-def normalize_booleans(df: pd.DataFrame) -> pd.DataFrame:
-    for col in df.columns:
-        unique_vals = df[col].dropna().unique()
-        if set(unique_vals).issubset({"Yes", "No", "yes", "no", "Y", "N", 1, 0, "True", "False", "true", "false", True, False}):
-            df[col] = df[col].replace({
-                "yes": "Yes",
-                "no": "No",
-                "Y": "Yes",
-                "N": "No",
-                1: "Yes",
-                0: "No",
-                "true": "Yes",
-                "false": "No",
-                True: "Yes",
-                False: "No"
-            })
-    return df
-
-def clean_numeric_columns(df: pd.DataFrame) -> pd.DataFrame:
-    for col in df.columns:
-        if df[col].dtype == object:
-            df[col] = df[col].str.replace(",", "")
-            df[col] = df[col].str.replace("$", "")
-            try:
-                # Only convert if actually numeric otherwise ignore (like ID strings)
-                df[col] = pd.to_numeric(df[col])
-            except ValueError:
-                pass
-    return df
-
-def handle_missing(df: pd.DataFrame) -> pd.DataFrame:
-    for col in df.columns:
-        if pd.api.types.is_numeric_dtype(df[col]):
-            if df[col].isna().any():
-                df[col] = df[col].fillna(df[col].median())
+# Cleaning runs in two steps: a per-column plan is inferred from a reservoir
+# sample and confirmed by one aggregate pass over the full table, then the
+# whole table is rewritten in one CREATE TABLE AS SELECT.
+CLEAN_SAMPLE_ROWS = int(os.getenv("CLEAN_SAMPLE_ROWS", 100_000))
+
+BOOLEAN_TRUE_VALUES = ("Yes", "yes", "Y", "True", "true")
+BOOLEAN_FALSE_VALUES = ("No", "no", "N", "False", "false")
+NUMERIC_SQL_TYPES = (
+    "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT",
+    "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT",
+    "FLOAT", "DOUBLE", "DECIMAL",
+)
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def is_numeric_sql_type(sql_type: str) -> bool:
+    return sql_type.upper().split("(")[0] in NUMERIC_SQL_TYPES
+
+
+def _sql_list(values) -> str:
+    return ", ".join("'" + v + "'" for v in values)
+
+
+def clean_column_names(names: List[str]) -> List[str]:
+    cleaned, seen = [], set()
+    for name in names:
+        new = re.sub(r"[^a-zA-Z0-9_]", "", name.strip().lower().replace(" ", "_")) or "column"
+        base, i = new, 1
+        while new in seen:
+            new = f"{base}_{i}"
+            i += 1
+        seen.add(new)
+        cleaned.append(new)
+    return cleaned
+
+
+def _trimmed(col: str) -> str:
+    return f"NULLIF(TRIM({col}), '')"
+
+
+def _numeric_text(col: str) -> str:
+    return f"TRY_CAST(REPLACE(REPLACE({_trimmed(col)}, ',', ''), '$', '') AS DOUBLE)"
+
+
+def infer_cleaning_plan(conn, source: str, sample_rows: int = CLEAN_SAMPLE_ROWS) -> List[Dict]:
+    """Decide how every column of `source` is cleaned.
+
+    Actions and fill values are inferred from a sample of rows. A single
+    aggregate pass over all rows then checks that text chosen as numeric
+    really casts everywhere (otherwise it stays text) and which numeric
+    columns have missing values at all.
+
+    Each plan entry has the source column, its cleaned name, an action
+    (boolean, boolean_numeric, boolean_native, numeric_text, numeric, text or keep)
+    and the value used to fill missing numbers, None when nothing is missing.
+    """
+    columns = [(row[0], row[1]) for row in conn.execute(f"DESCRIBE {source}").fetchall()]
+    names = clean_column_names([name for name, _ in columns])
+
+    exprs = []
+    for i, (name, sql_type) in enumerate(columns):
+        col = quote_identifier(name)
+        if sql_type == "VARCHAR":
+            exprs += [
+                f"bool_and({_trimmed(col)} IN ({_sql_list(BOOLEAN_TRUE_VALUES + BOOLEAN_FALSE_VALUES)})) AS b{i}",
+                f"bool_and({_numeric_text(col)} IS NOT NULL OR {_trimmed(col)} IS NULL) "
+                f"AND COUNT({_trimmed(col)}) > 0 AS n{i}",
+                f"MEDIAN({_numeric_text(col)}) AS m{i}",
+            ]
+        elif is_numeric_sql_type(sql_type):
+            exprs += [f"bool_and({col} IN (0, 1)) AS b{i}", f"MEDIAN({col}) AS m{i}"]
+    stats = {}
+    if exprs:
+        cursor = conn.execute(
+            f"SELECT {', '.join(exprs)} FROM (SELECT * FROM {source} USING SAMPLE {int(sample_rows)} ROWS)"
+        )
+        stats = dict(zip([d[0] for d in cursor.description], cursor.fetchone()))
+
+    actions = []
+    for i, (name, sql_type) in enumerate(columns):
+        is_bool, is_num = stats.get(f"b{i}"), stats.get(f"n{i}")
+        if sql_type == "BOOLEAN":
+            actions.append("boolean_native")
+        elif sql_type == "VARCHAR":
+            actions.append("boolean" if is_bool else "numeric_text" if is_num else "text")
+        elif is_numeric_sql_type(sql_type):
+            actions.append("boolean_numeric" if is_bool else "numeric")
         else:
-            if df[col].isna().any():
-                df[col] = df[col].fillna("Unknown")
-    return df
+            actions.append("keep")
+
+    # The sample only suggests numeric columns; confirm over every row
+    exprs = []
+    for i, ((name, _), action) in enumerate(zip(columns, actions)):
+        col = quote_identifier(name)
+        if action == "numeric_text":
+            exprs += [f"bool_and({_numeric_text(col)} IS NOT NULL OR {_trimmed(col)} IS NULL) AS v{i}",
+                      f"bool_or({_trimmed(col)} IS NULL) AS z{i}"]
+        elif action == "numeric":
+            exprs.append(f"bool_or({col} IS NULL) AS z{i}")
+    full = {}
+    if exprs:
+        cursor = conn.execute(f"SELECT {', '.join(exprs)} FROM {source}")
+        full = dict(zip([d[0] for d in cursor.description], cursor.fetchone()))
+
+    plan = []
+    for i, ((name, sql_type), new_name, action) in enumerate(zip(columns, names, actions)):
+        if action == "numeric_text" and not full.get(f"v{i}"):
+            action = "text"
+        median = stats.get(f"m{i}")
+        # Filling only where values are missing keeps integer columns integer
+        fill = action in ("numeric", "numeric_text") and median is not None and full.get(f"z{i}")
+        plan.append({
+            "source": name,
+            "target": new_name,
+            "action": action,
+            "fill": float(median) if fill else None,
+        })
+    return plan
+
+
+def _plan_expression(step: Dict) -> str:
+    col = quote_identifier(step["source"])
+    action = step["action"]
+    if action == "boolean_native":
+        expr = f"COALESCE(CASE WHEN {col} THEN 'Yes' WHEN NOT {col} THEN 'No' END, 'Unknown')"
+    elif action == "boolean":
+        # Values the sample did not contain are kept as-is rather than dropped
+        expr = (f"COALESCE(CASE WHEN {_trimmed(col)} IN ({_sql_list(BOOLEAN_TRUE_VALUES)}) THEN 'Yes' "
+                f"WHEN {_trimmed(col)} IN ({_sql_list(BOOLEAN_FALSE_VALUES)}) THEN 'No' "
+                f"ELSE {_trimmed(col)} END, 'Unknown')")
+    elif action == "boolean_numeric":
+        expr = f"COALESCE(CASE WHEN {col} = 1 THEN 'Yes' WHEN {col} = 0 THEN 'No' ELSE CAST({col} AS VARCHAR) END, 'Unknown')"
+    elif action in ("numeric", "numeric_text"):
+        expr = _numeric_text(col) if action == "numeric_text" else col
+        if step["fill"] is not None:
+            expr = f"COALESCE({expr}, {step['fill']!r})"
+    elif action == "text":
+        expr = f"COALESCE({_trimmed(col)}, 'Unknown')"
+    else:
+        expr = col
+    return f"{expr} AS {quote_identifier(step['target'])}"
+
+
+def apply_cleaning_plan(conn, source: str, target: str, plan: List[Dict]):
+    """Rewrite `source` into `target` in a single vectorized, de-duplicating pass."""
+    select_list = ", ".join(_plan_expression(step) for step in plan)
+    conn.execute(f"DROP TABLE IF EXISTS {target}")
+    conn.execute(f"CREATE TABLE {target} AS SELECT DISTINCT {select_list} FROM {source}")
+
+
+def clean_table(conn, source: str, target: str) -> List[Dict]:
+    plan = infer_cleaning_plan(conn, source)
+    apply_cleaning_plan(conn, source, target, plan)
+    return plan
+
 
 def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    df = clean_column_names(df)
-    df = clean_strings(df)
-    df = normalize_booleans(df)
-    df = clean_numeric_columns(df)
-    df = handle_missing(df)
-    df = df.drop_duplicates()
-    return df
+    """DataFrame entry point for the same engine; DuckDB scans the frame without per-cell copies."""
+    conn = duckdb.connect(":memory:")
+    try:
+        conn.register("raw_df", df)
+        clean_table(conn, "raw_df", "clean_df")
+        return conn.execute("SELECT * FROM clean_df").fetchdf()
+    finally:
+        conn.close()
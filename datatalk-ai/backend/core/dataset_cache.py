@@ -0,0 +1,108 @@
+import os
+import json
+import shutil
+import time
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+CACHE_DIR = Path(__file__).parent.parent / "storage" / "cache" / "datasets"
+DATASET_CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_MB", 10240)) * 1024 * 1024
+
+
+class DatasetCache:
+    """Content-addressed store of cleaned session databases and their upload artifacts.
+
+    Each entry is a directory named after the upload's SHA-256 holding the
+    DuckDB file and an artifacts.json written once the entry is complete.
+    Entries are evicted least-recently-used first once the total size
+    exceeds max_bytes.
+    """
+
+    def __init__(self, root: Path = CACHE_DIR, max_bytes: int = DATASET_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def db_path(self, content_hash: str) -> Path:
+        entry = self.root / content_hash
+        entry.mkdir(parents=True, exist_ok=True)
+        return entry / "data.duckdb"
+
+    def lock(self, content_hash: str) -> threading.Lock:
+        """Held while an entry's database is being built, so identical uploads load it once."""
+        with self._locks_guard:
+            return self._locks.setdefault(content_hash, threading.Lock())
+
+    def _artifacts_path(self, content_hash: str) -> Path:
+        return self.root / content_hash / "artifacts.json"
+
+    def get(self, content_hash: str) -> Optional[Dict]:
+        path = self._artifacts_path(content_hash)
+        try:
+            with open(path) as f:
+                artifacts = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        # The artifacts file's mtime is the entry's last-used time
+        os.utime(path, None)
+        self.hits += 1
+        return artifacts
+
+    def put(self, content_hash: str, artifacts: Dict):
+        path = self._artifacts_path(content_hash)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(artifacts, f, default=str)
+        os.replace(tmp_path, path)
+        self.evict(keep=content_hash)
+
+    def evict(self, keep: Optional[str] = None):
+        from core.ingestion import DataIngestion
+
+        in_use = DataIngestion.open_paths()
+        entries = []
+        total = 0
+        for entry in self.root.iterdir():
+            if not entry.is_dir():
+                continue
+            size = sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+            marker = entry / "artifacts.json"
+            last_used = marker.stat().st_mtime if marker.exists() else 0
+            entries.append((last_used, entry, size))
+            total += size
+
+        for last_used, entry, size in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            if entry.name == keep or (entry / "data.duckdb").resolve() in in_use or self.lock(entry.name).locked():
+                continue
+            # Entries that are still being written have no marker yet; leave fresh ones alone
+            if last_used == 0 and time.time() - entry.stat().st_mtime < 3600:
+                continue
+            try:
+                shutil.rmtree(entry)
+                total -= size
+            except OSError as e:
+                print(f"[DatasetCache] Could not evict {entry.name}: {e}")
+
+    def stats(self) -> Dict:
+        entries = [e for e in self.root.iterdir() if e.is_dir()]
+        total = sum(f.stat().st_size for e in entries for f in e.iterdir() if f.is_file())
+        return {
+            "entries": len(entries),
+            "size_bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Singleton instance
+dataset_cache = DatasetCache()
@@ -1,93 +1,270 @@
+import os
+import io
+import json
+import weakref
 import duckdb
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from pathlib import Path
-from typing import Tuple, Dict, Optional
+from typing import Iterator, Tuple, Dict, List, Optional
+from core.result_cache import ResultCache, canonical_sql_key, is_read_only, strip_leading_comments
+from core.resource_governor import governor, QueryTicket, QUERY_TIMEOUT
+
+# "native" loads CSVs with DuckDB's parallel reader and cleans them in SQL;
+# "pandas" keeps the original read_csv + DataFrame cleaning path.
+INGEST_MODE = os.getenv("INGEST_MODE", "native")
+
+# File suffix -> reader. Compressed CSVs are decompressed by DuckDB's reader itself.
+FILE_FORMATS = {
+    ".csv": "csv",
+    ".tsv": "csv",
+    ".csv.gz": "csv",
+    ".csv.zst": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+    ".jsonl": "json",
+    ".ndjson": "json",
+}
+
+
+# Cells pandas.read_csv reads as missing; the native reader treats them the same way
+CSV_NULL_STRINGS = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+
+
+# Most rows a query answer pulls into memory; larger results are cut and stay downloadable
+QUERY_ROW_LIMIT = int(os.getenv("QUERY_ROW_LIMIT", 10000))
+FETCH_BATCH_ROWS = int(os.getenv("FETCH_BATCH_ROWS", 8192))
+# Statements that can be wrapped as a subquery to push a LIMIT into the plan
+QUERY_KEYWORDS = ("SELECT", "WITH", "FROM", "VALUES", "TABLE")
+
+
+def limited_sql(sql: str, limit: int, offset: int = 0) -> Optional[str]:
+    """`sql` wrapped so DuckDB only produces `limit` rows after `offset`, or None if it is not a query.
+
+    The newlines keep a trailing line comment in `sql` from swallowing the
+    closing parenthesis.
+    """
+    body = sql.strip().rstrip(";").strip()
+    words = strip_leading_comments(body).lstrip("(").split(None, 1)
+    if not words or words[0].upper() not in QUERY_KEYWORDS:
+        return None
+    return f"SELECT * FROM (\n{body}\n) AS limited LIMIT {int(limit)} OFFSET {int(offset)}"
+
+
+def _arrow_reader(result, batch_rows: int):
+    return (result.to_arrow_reader(batch_rows) if hasattr(result, "to_arrow_reader")
+            else result.fetch_record_batch(batch_rows))
+
+
+def csv_delimiter(file_path: str) -> str:
+    """Field separator for the pandas reader; DuckDB's reader sniffs its own. Compression is inferred from the suffix."""
+    name = str(file_path).lower()
+    return "\t" if name.endswith(".tsv") else ","
+
+
+def detect_format(file_path: str) -> Optional[str]:
+    name = str(file_path).lower()
+    for suffix in sorted(FILE_FORMATS, key=len, reverse=True):
+        if name.endswith(suffix):
+            return FILE_FORMATS[suffix]
+    return None
 
 
 class DataIngestion:
-    def __init__(self):
-        self.conn = duckdb.connect(":memory:")
+    # Every open instance, so file owners (the dataset cache) can tell which files are in use
+    _open = weakref.WeakSet()
+
+    def __init__(self, db_path: Optional[str] = None):
+        # With a db_path the cleaned tables live in a DuckDB file that can be reopened later
+        self.db_path = db_path
+        self.conn = duckdb.connect(db_path or ":memory:")
+        DataIngestion._open.add(self)
+        governor.configure(self.conn, self._spill_name(db_path))
         self.schema_cache: Dict = {}
+        self.result_cache = ResultCache()
+        # Bumped whenever the session's tables change; derived results compare it to know they are stale
+        self.data_version = 0
 
-    def ingest_csv(self, file_path: str, table_name: str = "main_data") -> Tuple[Dict, Tuple]:
-        # Read CSV
-        from core.data_cleaner import clean_dataframe
-        df = pd.read_csv(file_path)
+    @staticmethod
+    def _spill_name(db_path: Optional[str]) -> Optional[str]:
+        # Cache entries are all <hash>/data.duckdb, so their directory is the recognisable part
+        if not db_path:
+            return None
+        path = Path(db_path)
+        return path.parent.name if path.stem == "data" else path.stem
 
-        # Apply Comprehensive Data Cleaning Engine
-        df = clean_dataframe(df)
+    @classmethod
+    def open_paths(cls) -> set:
+        """Resolved paths of the database files that open instances are using."""
+        return {Path(db.db_path).resolve() for db in list(cls._open) if db.db_path}
 
-        # Load into DuckDB
-        self.conn.execute(f"DROP TABLE IF EXISTS {table_name}")
-        self.conn.register("temp_df", df)
-        self.conn.execute(f"CREATE TABLE {table_name} AS SELECT * FROM temp_df")
+    @property
+    def schema_path(self) -> Optional[Path]:
+        return Path(self.db_path).with_suffix(".schema.json") if self.db_path else None
 
-        # Build schema
-        schema = self._profile_schema(df, table_name)
+    @classmethod
+    def restore(cls, db_path: str) -> Optional["DataIngestion"]:
+        """Reopen a persisted session database without touching the source CSV."""
+        schema_path = Path(db_path).with_suffix(".schema.json")
+        if not Path(db_path).exists() or not schema_path.exists():
+            return None
+        try:
+            with open(schema_path) as f:
+                snapshot = json.load(f)
+            db = cls(db_path)
+        except (OSError, ValueError, duckdb.Error) as e:
+            print(f"[DataIngestion] Could not restore {db_path}: {e}")
+            return None
+        db.schema_cache = snapshot.get("tables", {})
+        return db
+
+    def ingest_csv(self, file_path: str, table_name: str = "main_data", mode: Optional[str] = None) -> Tuple[Dict, Tuple]:
+        return self.ingest_file(file_path, table_name, mode, file_format="csv")
+
+    def ingest_file(self, file_path: str, table_name: str = "main_data", mode: Optional[str] = None,
+                    file_format: Optional[str] = None) -> Tuple[Dict, Tuple]:
+        file_format = file_format or detect_format(file_path) or "csv"
+        mode = mode or INGEST_MODE
+        self.data_changed()
+        if self.schema_path and self.schema_path.exists():
+            # The sidecar marks a complete snapshot; drop it until the new load has finished
+            self.schema_path.unlink()
+
+        result = None
+        if mode == "native" or file_format != "csv":
+            try:
+                result = self._ingest_native(file_path, file_format, table_name)
+            except duckdb.Error as e:
+                if file_format != "csv":
+                    raise
+                print(f"[DataIngestion] Native CSV load failed, falling back to pandas: {e}")
+        if result is None:
+            result = self._ingest_csv_pandas(file_path, table_name)
+
+        if self.db_path:
+            self._write_snapshot()
+        # Anything derived while the load was running saw a half-built table
+        self.data_changed()
+        return result
+
+    def memory_usage(self) -> int:
+        """Bytes this session holds in memory: DuckDB's buffers plus cached query results."""
+        try:
+            duckdb_bytes = self.cursor().execute("SELECT COALESCE(SUM(memory_usage_bytes), 0) FROM duckdb_memory()").fetchone()[0]
+        except duckdb.Error:
+            duckdb_bytes = 0
+        return int(duckdb_bytes) + self.result_cache.size_bytes
+
+    def spill(self, db_path: str):
+        """Copy an in-memory session database to `db_path` so `restore` can reopen it later."""
+        path_literal = "'" + str(db_path).replace("'", "''") + "'"
+        self.conn.execute(f"ATTACH {path_literal} AS spill")
+        try:
+            self.conn.execute("COPY FROM DATABASE memory TO spill")
+        finally:
+            self.conn.execute("DETACH spill")
+        self.db_path = str(db_path)
+        self._write_snapshot()
+
+    def close(self):
+        """Release the connection and cached results; file-backed data stays on disk for `restore`."""
+        self.result_cache.invalidate()
+        governor.forget(self.conn)
+        DataIngestion._open.discard(self)
+        try:
+            if self.db_path:
+                self.conn.execute("CHECKPOINT")
+        finally:
+            self.conn.close()
+
+    def _write_snapshot(self):
+        self.conn.execute("CHECKPOINT")
+        tmp_path = self.schema_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"tables": self.schema_cache}, f, default=str)
+        os.replace(tmp_path, self.schema_path)
+
+    def _ingest_native(self, file_path: str, file_format: str, table_name: str) -> Tuple[Dict, Tuple]:
+        from core.data_cleaner import clean_table
+
+        self._drop_raw_upload()
+        if file_format == "csv":
+            self._read_csv(file_path)
+        elif file_format == "json":
+            self.conn.execute(
+                "CREATE TEMP TABLE raw_upload AS SELECT * FROM read_json(?, format='newline_delimited')", [file_path]
+            )
+        elif file_format == "parquet":
+            # Columnar input is cleaned straight from the file, without a raw copy
+            path_literal = "'" + str(file_path).replace("'", "''") + "'"
+            self.conn.execute(f"CREATE TEMP VIEW raw_upload AS SELECT * FROM read_parquet({path_literal})")
+        elif file_format == "arrow":
+            import pyarrow.feather as feather
+            # Memory-mapped, so DuckDB scans the file's buffers in place
+            self.conn.register("raw_upload", feather.read_table(file_path, memory_map=True))
+        else:
+            raise ValueError(f"Unsupported file format: {file_format}")
+
+        try:
+            clean_table(self.conn, "raw_upload", table_name)
+        finally:
+            self._drop_raw_upload()
+
+        schema = self._profile_table(table_name)
         self.schema_cache[table_name] = schema
 
-        return schema, df.shape
-
-    def _profile_schema(self, df: pd.DataFrame, table_name: str) -> Dict:
-        schema = {}
-
-        for col in df.columns:
-            series = df[col]
-            null_count = int(series.isna().sum())
-            unique_count = int(series.nunique())
-
-            col_info = {
-                "null_count": null_count,
-                "unique_count": unique_count,
-            }
-
-            # Determine column type
-            if self._is_id_column(col, series):
-                col_info["type"] = "id"
-
-            elif pd.api.types.is_numeric_dtype(series):
-                col_info["type"] = "numeric"
-                col_info["min"] = round(float(series.min()), 2)
-                col_info["max"] = round(float(series.max()), 2)
-                col_info["mean"] = round(float(series.mean()), 2)
-                col_info["median"] = round(float(series.median()), 2)
-                col_info["std"] = round(float(series.std()), 2)
-
-            elif self._is_boolean_column(series):
-                col_info["type"] = "boolean"
-                col_info["unique_values"] = series.dropna().unique().tolist()
-                vc = series.value_counts().to_dict()
-                col_info["value_counts"] = {str(k): int(v) for k, v in vc.items()}
-
-            elif unique_count <= 30:
-                col_info["type"] = "categorical"
-                col_info["unique_values"] = series.dropna().unique().tolist()
-                vc = series.value_counts().head(20).to_dict()
-                col_info["value_counts"] = {str(k): int(v) for k, v in vc.items()}
+        row_count = self.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        return schema, (row_count, len(schema))
 
-            else:
-                col_info["type"] = "text"
-                col_info["sample_values"] = series.dropna().head(5).tolist()
+    def _read_csv(self, file_path: str):
+        """Parse a CSV straight into DuckDB; the raw copy lives in the temp catalog only until cleaned."""
+        sql = "CREATE TEMP TABLE raw_upload AS SELECT * FROM read_csv(?, auto_detect=true, nullstr=?{})"
+        try:
+            self.conn.execute(sql.format(""), [file_path, CSV_NULL_STRINGS])
+        except duckdb.ConversionException as e:
+            # Column types are sniffed from the first 20,480 rows; a later value that does not
+            # fit needs them sniffed from every row (clean_table re-infers numeric text anyway)
+            print(f"[DataIngestion] Sampled CSV types did not fit, rescanning the whole file: {e.args[0].splitlines()[0]}")
+            self.conn.execute(sql.format(", sample_size=-1"), [file_path, CSV_NULL_STRINGS])
+
+    def _drop_raw_upload(self):
+        # raw_upload is a temp table, a view over a file, or a registered Arrow table (listed as a view)
+        row = self.conn.execute(
+            "SELECT table_type FROM information_schema.tables WHERE table_name = 'raw_upload'"
+        ).fetchone()
+        if row is not None:
+            self.conn.execute(f"DROP {'VIEW' if row[0] == 'VIEW' else 'TABLE'} raw_upload")
+
+    def _ingest_csv_pandas(self, file_path: str, table_name: str) -> Tuple[Dict, Tuple]:
+        # Read CSV
+        from core.data_cleaner import clean_table
+        df = pd.read_csv(file_path, sep=csv_delimiter(file_path))
 
-            schema[col] = col_info
+        # Clean while copying the DataFrame into DuckDB
+        self.conn.register("temp_df", df)
+        try:
+            clean_table(self.conn, "temp_df", table_name)
+        finally:
+            self.conn.unregister("temp_df")
 
-        return schema
+        # Build schema
+        schema = self._profile_table(table_name)
+        self.schema_cache[table_name] = schema
 
-    def _is_id_column(self, col_name: str, series: pd.Series) -> bool:
-        id_keywords = ["id", "uuid", "key", "code", "customerid", "userid", "orderid"]
-        col_lower = col_name.lower()
-        return any(kw in col_lower for kw in id_keywords) and series.nunique() > 100
+        row_count = self.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        return schema, (row_count, len(schema))
 
-    def _is_boolean_column(self, series: pd.Series) -> bool:
-        unique_vals = set(str(v).strip().lower() for v in series.dropna().unique())
-        boolean_pairs = [
-            {"yes", "no"},
-            {"true", "false"},
-            {"0", "1"},
-            {"y", "n"},
-        ]
-        return any(unique_vals == pair for pair in boolean_pairs)
+    def _profile_table(self, table_name: str, approximate: Optional[bool] = None) -> Dict:
+        from core.schema_profiler import SchemaProfiler
+        return SchemaProfiler(self.conn).profile(table_name, approximate=approximate)
 
     def detect_target_column(self, schema: Dict) -> Optional[str]:
         target_keywords = [
@@ -107,18 +284,173 @@ class DataIngestion:
 
         return boolean_cols[0] if boolean_cols else None
 
+    def data_changed(self):
+        self.result_cache.invalidate()
+        self.data_version += 1
+
+    def cursor(self):
+        """A connection of its own for the calling thread; query stages read the session concurrently."""
+        return self.conn.cursor()
+
     def execute(self, sql: str):
-        return self.conn.execute(sql)
+        cursor = self.cursor()
+        read_only = is_read_only(cursor, sql)
+        result = cursor.execute(sql)
+        if not read_only:
+            self.data_changed()
+        return result
 
-    def execute_query(self, sql: str):
+    def query_arrow(self, sql: str, params: Optional[List] = None, max_rows: Optional[int] = None,
+                    cursor=None) -> pa.Table:
+        """Run `sql` and return its result as an Arrow table, served from the result cache when possible.
+
+        With `max_rows`, the query is limited to max_rows + 1 rows so callers
+        can tell that the result was cut, and record batches stop being read
+        once that many rows have arrived.
+        """
+        if max_rows is not None:
+            capped = limited_sql(sql, max_rows + 1)
+            if capped is not None:
+                try:
+                    return self.query_arrow(capped, params, max_rows=None, cursor=cursor)
+                except duckdb.ParserException:
+                    # e.g. several statements in one string; read the original in batches instead
+                    pass
+
+        cursor = cursor or self.cursor()
+        key = canonical_sql_key(cursor, sql, params)
+        if key and max_rows is not None:
+            # A capped read must not answer later uncapped reads of the same query
+            key = f"{key}:{max_rows}"
+        table = self.result_cache.get(key) if key else None
+        if table is None:
+            result = cursor.execute(sql, params) if params else cursor.execute(sql)
+            if max_rows is None:
+                table = result.to_arrow_table() if hasattr(result, "to_arrow_table") else result.fetch_arrow_table()
+            else:
+                table = self._read_batches(result, max_rows + 1)
+            if key:
+                self.result_cache.put(key, table)
+            elif not is_read_only(cursor, sql):
+                self.data_changed()
+        return table
+
+    @staticmethod
+    def _read_batches(result, max_rows: int) -> pa.Table:
+        reader = _arrow_reader(result, FETCH_BATCH_ROWS)
+        batches, rows = [], 0
+        for batch in reader:
+            batches.append(batch)
+            rows += batch.num_rows
+            if rows >= max_rows:
+                break
+        return pa.Table.from_batches(batches, schema=reader.schema).slice(0, max_rows)
+
+    def statement_error(self, sql: str, cursor=None) -> Optional[str]:
+        """None when `sql` parses as exactly one SELECT, otherwise why it may not run as a query.
+
+        Cached datasets are one file shared by every session that uploaded
+        the same content, so a query must never write to it.
+        """
+        cursor = cursor or self.cursor()
+        try:
+            tree = json.loads(cursor.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+        except duckdb.Error as e:
+            return str(e)
+        if tree.get("error"):
+            # json_serialize_sql refuses anything that is not a SELECT, including CTEs ending in DML
+            if tree.get("error_type") == "not implemented":
+                return "Only SELECT queries are allowed."
+            return tree.get("error_message") or "Could not parse the SQL."
+        if len(tree["statements"]) != 1:
+            return "Expected exactly one SELECT statement."
+        return None
+
+    def validate_sql(self, sql: str, params: Optional[List] = None) -> Optional[str]:
+        """Parse and bind `sql` without running it.
+
+        Returns None when `sql` is a single SELECT that DuckDB would accept,
+        otherwise the parser or binder error. EXPLAIN plans the query but
+        reads no data, so this costs about a millisecond.
+        """
+        cursor = self.cursor()
+        error = self.statement_error(sql, cursor)
+        if error:
+            return error
+        try:
+            body = sql.strip().rstrip(";")
+            cursor.execute(f"EXPLAIN {body}", params) if params else cursor.execute(f"EXPLAIN {body}")
+        except duckdb.Error as e:
+            return str(e)
+        return None
+
+    def execute_query(self, sql: str, params: Optional[List] = None, max_rows: Optional[int] = QUERY_ROW_LIMIT,
+                      timeout: Optional[float] = QUERY_TIMEOUT, ticket: Optional[QueryTicket] = None):
+        """Run `sql`, which must be a single SELECT, and return (DataFrame, error).
+
+        At most `max_rows` rows are returned; `df.attrs["truncated"]` is True
+        when the query produced more. The query runs in a slot from the
+        resource governor and is interrupted after `timeout` seconds or when
+        `ticket` is cancelled.
+        """
         try:
-            result = self.conn.execute(sql).fetchdf()
+            with governor.run(self, timeout, ticket) as cursor:
+                error = self.statement_error(sql, cursor)
+                if error:
+                    return None, error
+                table = self.query_arrow(sql, params, max_rows, cursor=cursor)
+            truncated = max_rows is not None and table.num_rows > max_rows
+            if truncated:
+                table = table.slice(0, max_rows)
+            result = self.to_frame(table)
+            result.attrs["truncated"] = truncated
             return result, None
         except Exception as e:
             return None, str(e)
 
+    def to_frame(self, table: pa.Table) -> pd.DataFrame:
+        # Convert through DuckDB so dtypes match fetchdf (e.g. HUGEINT sums as float64, not Decimal)
+        return self.cursor().from_arrow(table).df()
+
+    def fetch_page(self, sql: str, params: Optional[List] = None, offset: int = 0, limit: int = 500,
+                   timeout: Optional[float] = QUERY_TIMEOUT, ticket: Optional[QueryTicket] = None) -> Tuple[pa.Table, bool]:
+        """One page of a query's rows, plus whether more rows follow it."""
+        paged = limited_sql(sql, limit + 1, offset)
+        with governor.run(self, timeout, ticket) as cursor:
+            table = None
+            if paged is not None:
+                try:
+                    table = self.query_arrow(paged, params, cursor=cursor)
+                except duckdb.ParserException:
+                    # Same fallback as query_arrow: page the complete, uncapped result
+                    pass
+            if table is None:
+                table = self.query_arrow(sql, params, cursor=cursor).slice(offset, limit + 1)
+        return table.slice(0, limit), table.num_rows > limit
+
+    def stream_csv(self, sql: str, params: Optional[List] = None) -> Iterator[bytes]:
+        """The complete result of `sql` as CSV, encoded one record batch at a time.
+
+        Bypasses the result cache so arbitrarily large results never sit in memory whole.
+        It holds no governor slot, since a slow client would keep it for the
+        whole download; the session's thread and memory limits still apply.
+        """
+        cursor = self.cursor()
+        result = cursor.execute(sql, params) if params else cursor.execute(sql)
+        reader = _arrow_reader(result, FETCH_BATCH_ROWS)
+        header = True
+        for batch in reader:
+            buffer = io.BytesIO()
+            pa_csv.write_csv(batch, buffer, pa_csv.WriteOptions(include_header=header))
+            header = False
+            yield buffer.getvalue()
+        if header:
+            buffer = io.BytesIO()
+            pa_csv.write_csv(reader.schema.empty_table(), buffer)
+            yield buffer.getvalue()
+
     def get_schema(self, table_name: str = "main_data") -> Dict:
         return self.schema_cache.get(table_name, {})
 
     def get_sample_rows(self, table_name: str = "main_data", n: int = 5) -> pd.DataFrame:
-        return self.conn.execute(f"SELECT * FROM {table_name} LIMIT {n}").fetchdf()
\ No newline at end of file
+        return self.cursor().execute(f"SELECT * FROM {table_name} LIMIT {n}").fetchdf()
\ No newline at end of file
@@ -1,3 +1,4 @@
+import threading
 import pandas as pd
 import numpy as np
 from scipy import stats
@@ -6,6 +7,26 @@ from typing import List, Dict, Any
 class InsightDiscovery:
     def __init__(self, db):
         self.db = db
+        # Categorical insights depend only on the data and target, not on the question
+        self._insights_lock = threading.Lock()
+        self._insights_source = None
+        self._insights: List[Dict[str, Any]] = []
+
+    def categorical_insights(self, target_col: str, schema: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """discover_categorical_insights, computed once per data version and target column.
+
+        Concurrent callers wait for the first computation instead of repeating it.
+        """
+        with self._insights_lock:
+            source = self._insights_source
+            if (source and source[0] == self.db.data_version and source[1] == target_col
+                    and source[2] is schema):
+                return self._insights
+            version = self.db.data_version
+            insights = self.discover_categorical_insights(target_col, schema)
+            self._insights_source = (version, target_col, schema)
+            self._insights = insights
+            return insights
 
     def discover_categorical_insights(self, target_col: str, schema: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Run automatic feature scan on categorical columns relative to a target metric."""
@@ -17,19 +38,23 @@ class InsightDiscovery:
             return []
 
         insights = []
-        cat_cols = [c for c, t in schema.items() if (t == 'categorical' or t == 'text') and c != target_col]
+        cat_cols = [c for c, t in schema.items()
+                    if isinstance(t, dict) and t.get("type") in ("categorical", "text") and c != target_col]
         
         # Check if target is binary (for rate calculation, like churn)
         is_binary = df[target_col].nunique() == 2
+        if is_binary:
+            # Assume positive value is 'Yes', '1' or 'true'
+            pos_vals = [v for v in df[target_col].unique() if str(v).lower() in ['yes', '1', 'true']]
+            if not pos_vals:
+                return []
+            is_positive = df[target_col] == pos_vals[0]
         
         for col in cat_cols:
             try:
                 if is_binary:
                     # Compute rates per category
-                    # Assume positive value is 'Yes', '1', or the second unique value
-                    pos_val = [v for v in df[target_col].unique() if str(v).lower() in ['yes', '1', 'true']][0]
-                    
-                    grouped = df.groupby(col)[target_col].apply(lambda x: (x == pos_val).mean() * 100).sort_values(ascending=False)
+                    grouped = (is_positive.groupby(df[col]).mean() * 100).sort_values(ascending=False)
                     
                     spread = grouped.max() - grouped.min()
                     if spread > 5: # Significant enough
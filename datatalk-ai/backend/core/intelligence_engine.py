@@ -1,8 +1,9 @@
 import json
 import re
-from typing import List, Dict, Any, Optional
-from core.nvidia_client import nvidia_complete
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+from core.nvidia_client import nvidia_complete, nvidia_complete_async, nvidia_stream_async
 from core.prompt_manager import prompt_manager
+from core.number_index import NumberIndex, mark_unverified
 from models.ai_models import AnalyticMission, GroundedAnswer, ExecutiveReport, AutoInsights
 import pandas as pd
 
@@ -13,15 +14,25 @@ class IntelligenceEngine:
         self.table = table_name
         self.conversation_history: List[Dict] = []
 
+    # Each step builds its prompt and parses the reply separately, so it can be
+    # called blocking (`classify_intent`) or awaited (`classify_intent_async`).
+
     def classify_intent(self, question: str) -> AnalyticMission:
         """Step 1: Parse user intent into an Analytic Mission."""
+        return self._parse_intent(nvidia_complete(**self._intent_request(question)))
+
+    async def classify_intent_async(self, question: str) -> AnalyticMission:
+        return self._parse_intent(await nvidia_complete_async(**self._intent_request(question)))
+
+    def _intent_request(self, question: str) -> Dict[str, Any]:
         history_str = json.dumps(self.conversation_history[-3:]) if self.conversation_history else "None"
-        schema_info = json.dumps(self.schema_analyzer.schema)
+        schema_info = self.schema_analyzer.schema_context(question)
         
         system_prompt = prompt_manager.get_prompt("intent_classification")
         user_content = f"QUESTION: {question}\nSCHEMA: {schema_info}\nPREVIOUS_INTERACTION: {history_str}"
-        
-        response = nvidia_complete(system_prompt, user_content, max_tokens=1024, temperature=0.1)
+        return dict(system_prompt=system_prompt, user_message=user_content, max_tokens=1024, temperature=0.1)
+
+    def _parse_intent(self, response: str) -> AnalyticMission:
         # Extract JSON from response
         json_match = re.search(r'\{.*\}', response, re.DOTALL)
         if json_match:
@@ -31,11 +42,19 @@ class IntelligenceEngine:
 
     def generate_sql(self, mission: AnalyticMission) -> str:
         """Step 2: Generate deterministic SQL from the Analytic Mission."""
-        schema_info = json.dumps(self.schema_analyzer.schema)
+        return self._parse_sql(nvidia_complete(**self._sql_request(mission)))
+
+    async def generate_sql_async(self, mission: AnalyticMission) -> str:
+        return self._parse_sql(await nvidia_complete_async(**self._sql_request(mission)))
+
+    def _sql_request(self, mission: AnalyticMission) -> Dict[str, Any]:
+        focus = " ".join(mission.target_columns + [mission.metric or "", mission.methodology])
+        schema_info = self.schema_analyzer.schema_context(focus)
         system_prompt = prompt_manager.get_prompt("sql_generation")
         user_content = f"MISSION: {mission.json()}\nSCHEMA: {schema_info}\nTABLE: {self.table}"
-        
-        sql = nvidia_complete(system_prompt, user_content, max_tokens=512, temperature=0.1)
+        return dict(system_prompt=system_prompt, user_message=user_content, max_tokens=512, temperature=0.1)
+
+    def _parse_sql(self, sql: str) -> str:
         sql = sql.replace("```sql", "").replace("```", "").strip()
         if "UNSUPPORTED_QUERY" in sql:
             return "UNSUPPORTED"
@@ -43,12 +62,32 @@ class IntelligenceEngine:
 
     def ground_answer(self, question: str, sql_result: pd.DataFrame, sql_query: str) -> GroundedAnswer:
         """Step 3: Generate a data-backed answer strictly from execution results."""
-        data_json = sql_result.round(2).to_dict(orient="records")
+        response = nvidia_complete(**self._grounding_request(question, sql_result, sql_query))
+        return self._parse_grounded_answer(response, sql_result)
+
+    async def ground_answer_async(self, question: str, sql_result: pd.DataFrame, sql_query: str) -> GroundedAnswer:
+        response = await nvidia_complete_async(**self._grounding_request(question, sql_result, sql_query))
+        return self._parse_grounded_answer(response, sql_result)
+
+    async def ground_answer_stream_async(self, question: str, sql_result: pd.DataFrame, sql_query: str,
+                                         on_token: Callable[[str], Awaitable[None]]) -> GroundedAnswer:
+        """Like ground_answer_async, but hands each chunk of the reply to `on_token` as it arrives.
+
+        Chunks are the raw model text; the returned answer is the verified one.
+        """
+        chunks = []
+        async for chunk in nvidia_stream_async(**self._grounding_request(question, sql_result, sql_query)):
+            chunks.append(chunk)
+            await on_token(chunk)
+        return self._parse_grounded_answer("".join(chunks), sql_result)
+
+    def _grounding_request(self, question: str, sql_result: pd.DataFrame, sql_query: str) -> Dict[str, Any]:
+        data_json = sql_result.head(20).round(2).to_dict(orient="records")
         system_prompt = prompt_manager.get_prompt("answer_grounding")
-        user_content = f"QUESTION: {question}\nSQL_QUERY: {sql_query}\nSQL_RESULT: {json.dumps(data_json[:20])}"
-        
-        response = nvidia_complete(system_prompt, user_content, max_tokens=1024, temperature=0.1)
-        
+        user_content = f"QUESTION: {question}\nSQL_QUERY: {sql_query}\nSQL_RESULT: {json.dumps(data_json)}"
+        return dict(system_prompt=system_prompt, user_message=user_content, max_tokens=1024, temperature=0.1)
+
+    def _parse_grounded_answer(self, response: str, sql_result: pd.DataFrame) -> GroundedAnswer:
         # Robust parsing for split sections
         recs = []
         if "BUSINESS RECOMMENDATIONS" in response:
@@ -64,31 +103,25 @@ class IntelligenceEngine:
         answer_part = answer_part.replace("**", "")
 
         # Numeric Verification (Anti-Hallucination)
-        allowed_numbers = self._extract_numbers_from_df(sql_result)
-        # Extract numbers, handling comma separators
-        found_nums = re.findall(r"[-+]?\d*\.\d+|\d+", answer_part.replace(",", ""))
-        
-        for num_str in found_nums:
-            try:
-                val = float(num_str)
-                # Allow small tolerance for rounding or percentage diffs
-                if not any(abs(val - float(a)) < 0.05 for a in allowed_numbers):
-                    # If it's a small integer like 1, 2, 3 (list numbering), ignore
-                    if val < 10 and len(num_str) == 1: continue
-                    answer_part = answer_part.replace(num_str, f"{num_str}[UNVERIFIED]")
-            except ValueError:
-                continue
+        answer_part = mark_unverified(answer_part, NumberIndex.from_frame(sql_result))
 
         return GroundedAnswer(answer=answer_part, recommendations=recs[:3])
 
     def generate_executive_report(self, question: str, answer: str, sql_result: pd.DataFrame) -> ExecutiveReport:
         """Step 4: Synthesize high-level business report."""
+        return self._parse_report(nvidia_complete(**self._report_request(question, answer, sql_result)))
+
+    async def generate_executive_report_async(self, question: str, answer: str,
+                                              sql_result: pd.DataFrame) -> ExecutiveReport:
+        return self._parse_report(await nvidia_complete_async(**self._report_request(question, answer, sql_result)))
+
+    def _report_request(self, question: str, answer: str, sql_result: pd.DataFrame) -> Dict[str, Any]:
         kpis = sql_result.describe().to_dict() if not sql_result.empty else {}
         system_prompt = prompt_manager.get_prompt("executive_summary")
         user_content = f"QUESTION: {question}\nANSWER: {answer}\nKPI_STATS: {json.dumps(kpis)}"
-        
-        response = nvidia_complete(system_prompt, user_content, max_tokens=1024, temperature=0.1)
-        
+        return dict(system_prompt=system_prompt, user_message=user_content, max_tokens=1024, temperature=0.1)
+
+    def _parse_report(self, response: str) -> ExecutiveReport:
         def extract(field):
             # Look for "Field Name:", "**Field Name:**", "1. Field Name:", etc.
             pattern = rf"(?:^|\n)(?:\d+\.\s*)?(?:\*\*)?{field}(?:\*\*)?:?\s*(.*)"
@@ -105,18 +138,16 @@ class IntelligenceEngine:
 
     def explain_chart(self, chart_type: str, result_df: pd.DataFrame, question: str) -> str:
         """Multimodal Explanation Mode."""
+        return nvidia_complete(**self._chart_request(chart_type, result_df, question))
+
+    async def explain_chart_async(self, chart_type: str, result_df: pd.DataFrame, question: str) -> str:
+        return await nvidia_complete_async(**self._chart_request(chart_type, result_df, question))
+
+    def _chart_request(self, chart_type: str, result_df: pd.DataFrame, question: str) -> Dict[str, Any]:
         system_prompt = prompt_manager.get_prompt("chart_interpretation")
         snippet = result_df.head(5).to_dict(orient="records")
         user_content = f"CHART_TYPE: {chart_type}\nMETADATA: {json.dumps(snippet)}\nQUESTION: {question}"
-        
-        return nvidia_complete(system_prompt, user_content, max_tokens=512, temperature=0.1)
-
-    def _extract_numbers_from_df(self, df: pd.DataFrame) -> List[float]:
-        numbers = []
-        for col in df.columns:
-            if pd.api.types.is_numeric_dtype(df[col]):
-                numbers.extend(df[col].tolist())
-        return [float(n) for n in numbers if pd.notnull(n)]
+        return dict(system_prompt=system_prompt, user_message=user_content, max_tokens=512, temperature=0.1)
 
     def add_to_history(self, question: str, sql: str, answer: str):
         self.conversation_history.append({"q": question, "sql": sql, "a": answer})
@@ -0,0 +1,82 @@
+import re
+import warnings
+import numpy as np
+import pandas as pd
+
+# Numbers as an answer writes them: 1,234.5  -3.2  .75  42
+NUMBER_PATTERN = re.compile(r"(?:(?<![\w.])[-+])?(?:(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|\.\d+)")
+# Absolute difference within which a cited number counts as matching the data
+VERIFY_TOLERANCE = 0.05
+UNVERIFIED_TAG = "[UNVERIFIED]"
+
+
+class NumberIndex:
+    """Sorted array of every number an answer may cite from a result, for tolerance lookups.
+
+    Besides the cells themselves it holds what answers commonly derive
+    from them: whole-number roundings, fractions written as percentages,
+    each value's share of its column total, column totals, means, minima
+    and maxima, large values in thousands/millions/billions, and the row count.
+    """
+
+    def __init__(self, values: np.ndarray, tolerance: float = VERIFY_TOLERANCE):
+        values = np.asarray(values, dtype=float)
+        self.values = np.unique(values[np.isfinite(values)])
+        self.tolerance = tolerance
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, tolerance: float = VERIFY_TOLERANCE) -> "NumberIndex":
+        if df is None or df.empty:
+            return cls(np.empty(0), tolerance)
+        numeric = df.select_dtypes(include=["number", "bool"])
+        cells = numeric.to_numpy(dtype=float, na_value=np.nan) if not numeric.empty else np.empty((0, 0))
+
+        parts = [cells.ravel(), np.round(cells).ravel(), [len(df)]]
+        if cells.size:
+            with warnings.catch_warnings():
+                # All-null columns; their aggregates are NaN and dropped by the constructor
+                warnings.simplefilter("ignore", RuntimeWarning)
+                totals = np.nansum(cells, axis=0)
+                parts += [totals, np.nanmean(cells, axis=0), np.nanmin(cells, axis=0), np.nanmax(cells, axis=0)]
+                # Rates stored as fractions are usually quoted as percentages
+                fractions = np.nanmax(np.abs(cells), axis=0) <= 1
+                parts.append((cells[:, fractions] * 100).ravel())
+                # "X accounts for 42% of the total"
+                shares = (totals > 0) & (np.nanmin(cells, axis=0) >= 0)
+                parts.append((cells[:, shares] / totals[shares] * 100).ravel())
+            large = cells[np.abs(cells) >= 1000]
+            parts += [large / 1e3, large / 1e6, large / 1e9]
+        return cls(np.concatenate([np.ravel(p) for p in parts]), tolerance)
+
+    def contains_many(self, numbers) -> np.ndarray:
+        """For each number, whether some indexed value lies within the tolerance."""
+        numbers = np.asarray(numbers, dtype=float)
+        if not self.values.size:
+            return np.zeros(numbers.shape, dtype=bool)
+        upper = np.clip(np.searchsorted(self.values, numbers), 0, self.values.size - 1)
+        lower = np.clip(upper - 1, 0, self.values.size - 1)
+        return ((np.abs(self.values[upper] - numbers) < self.tolerance)
+                | (np.abs(self.values[lower] - numbers) < self.tolerance))
+
+    def contains(self, number: float) -> bool:
+        return bool(self.contains_many([number])[0])
+
+
+def mark_unverified(text: str, index: NumberIndex) -> str:
+    """Tag every number in `text` that the index cannot account for.
+
+    Single-digit integers are left alone; they are mostly list numbering.
+    """
+    matches = list(NUMBER_PATTERN.finditer(text))
+    if not matches:
+        return text
+    verified = index.contains_many([float(m.group().replace(",", "")) for m in matches])
+    parts, last = [], 0
+    for match, ok in zip(matches, verified):
+        token = match.group()
+        if ok or (len(token) == 1 and token.isdigit()):
+            continue
+        parts += [text[last:match.end()], UNVERIFIED_TAG]
+        last = match.end()
+    parts.append(text[last:])
+    return "".join(parts)
@@ -1,23 +1,50 @@
 """
 Shared LLM client — now using Groq API (OpenAI-compatible).
 Model: llama-3.3-70b-versatile (fast, free-tier friendly)
+
+Both entry points reuse pooled keep-alive connections, cap the number of
+in-flight requests and retry 429/5xx responses with jittered backoff.
+`nvidia_complete` blocks; `nvidia_complete_async` is for async handlers.
+Non-empty completions are cached by (model, prompts, max_tokens, temperature).
 """
 import os
+import time
+import random
+import asyncio
+import threading
 import json
-import requests
+import weakref
+import httpx
+from typing import AsyncIterator
+from core.llm_cache import llm_cache, completion_key
 
 GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
 GROQ_MODEL = "llama-3.3-70b-versatile"
 
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
 
-def nvidia_complete(system_prompt: str, user_message: str, max_tokens: int = 1024, temperature: float = 0.6) -> str:
-    """
-    Call Groq API and return the full response text.
-    Falls back to empty string on any error.
-    """
+_LIMITS = httpx.Limits(
+    max_connections=LLM_MAX_CONCURRENCY,
+    max_keepalive_connections=LLM_MAX_CONCURRENCY,
+    keepalive_expiry=60,
+)
+
+_sync_client = None
+_sync_client_lock = threading.Lock()
+_sync_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+# Async clients and semaphores are bound to the event loop that created them
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _build_request(system_prompt: str, user_message: str, max_tokens: int, temperature: float, stream: bool = False):
     api_key = os.getenv("GROQ_API_KEY")
     if not api_key:
-        return ""
+        return None, None
 
     headers = {
         "Authorization": f"Bearer {api_key}",
@@ -33,17 +60,190 @@ def nvidia_complete(system_prompt: str, user_message: str, max_tokens: int = 102
         "max_tokens": max_tokens,
         "temperature": temperature,
         "top_p": 0.95,
-        "stream": False,
+        "stream": stream,
     }
+    return headers, payload
+
+
+def _retry_delay(attempt: int, response=None) -> float:
+    """Full-jitter exponential backoff, honouring a server-sent Retry-After."""
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after")), LLM_BACKOFF_MAX)
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
 
+
+def _should_retry(attempt: int, response=None, error=None) -> bool:
+    if attempt >= LLM_MAX_RETRIES:
+        return False
+    if error is not None:
+        return isinstance(error, httpx.TransportError)
+    return response.status_code in RETRY_STATUS_CODES
+
+
+def _cached(system_prompt: str, user_message: str, max_tokens: int, temperature: float):
+    """Returns (cache key, cached completion or None); the key is None when caching is off."""
+    if llm_cache is None:
+        return None, None
+    key = completion_key(GROQ_MODEL, system_prompt, user_message, max_tokens, temperature)
+    return key, llm_cache.get(key)
+
+
+def _finish(response, error, cache_key) -> str:
     try:
-        response = requests.post(GROQ_URL, headers=headers, json=payload, timeout=60)
+        if error is not None:
+            raise error
         response.raise_for_status()
         data = response.json()
-        return data["choices"][0]["message"]["content"].strip()
+        text = data["choices"][0]["message"]["content"].strip()
     except Exception as e:
         print(f"[GroqClient] API error: {e}")
         return ""
+    if cache_key is not None and text:
+        llm_cache.put(cache_key, text)
+    return text
+
+
+def get_client() -> httpx.Client:
+    global _sync_client
+    with _sync_client_lock:
+        if _sync_client is None:
+            _sync_client = httpx.Client(limits=_LIMITS, timeout=60)
+        return _sync_client
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        _async_clients[loop] = (
+            httpx.AsyncClient(limits=_LIMITS, timeout=60),
+            asyncio.Semaphore(LLM_MAX_CONCURRENCY),
+        )
+    return _async_clients[loop]
+
+
+def nvidia_complete(system_prompt: str, user_message: str, max_tokens: int = 1024, temperature: float = 0.6,
+                    timeout: float = 60, cache: bool = True) -> str:
+    """
+    Call Groq API and return the full response text.
+    Falls back to empty string on any error.
+    """
+    headers, payload = _build_request(system_prompt, user_message, max_tokens, temperature)
+    if headers is None:
+        return ""
+    cache_key, hit = _cached(system_prompt, user_message, max_tokens, temperature) if cache else (None, None)
+    if hit is not None:
+        return hit
+
+    client = get_client()
+    attempt = 0
+    while True:
+        response, error = None, None
+        try:
+            with _sync_slots:
+                response = client.post(GROQ_URL, headers=headers, json=payload, timeout=timeout)
+        except Exception as e:
+            error = e
+        if not _should_retry(attempt, response, error):
+            break
+        time.sleep(_retry_delay(attempt, response))
+        attempt += 1
+
+    return _finish(response, error, cache_key)
+
+
+async def nvidia_complete_async(system_prompt: str, user_message: str, max_tokens: int = 1024,
+                                temperature: float = 0.6, timeout: float = 60, cache: bool = True) -> str:
+    """Async counterpart of `nvidia_complete`; same arguments and the same empty-string fallback."""
+    headers, payload = _build_request(system_prompt, user_message, max_tokens, temperature)
+    if headers is None:
+        return ""
+    cache_key, hit = _cached(system_prompt, user_message, max_tokens, temperature) if cache else (None, None)
+    if hit is not None:
+        return hit
+
+    client, slots = get_async_client()
+    attempt = 0
+    while True:
+        response, error = None, None
+        try:
+            async with slots:
+                response = await client.post(GROQ_URL, headers=headers, json=payload, timeout=timeout)
+        except Exception as e:
+            error = e
+        if not _should_retry(attempt, response, error):
+            break
+        await asyncio.sleep(_retry_delay(attempt, response))
+        attempt += 1
+
+    return _finish(response, error, cache_key)
+
+
+async def nvidia_stream_async(system_prompt: str, user_message: str, max_tokens: int = 1024,
+                              temperature: float = 0.6, timeout: float = 60, cache: bool = True) -> AsyncIterator[str]:
+    """Yield the completion in chunks as the model produces them.
+
+    Retries only happen before the first chunk. An error before any chunk
+    ends the stream empty, like the empty-string fallback of
+    `nvidia_complete_async`; an error after that is raised, so a cut-off
+    reply never passes for a complete one. A cached completion is yielded
+    as a single chunk.
+    """
+    headers, payload = _build_request(system_prompt, user_message, max_tokens, temperature, stream=True)
+    if headers is None:
+        return
+    cache_key, hit = _cached(system_prompt, user_message, max_tokens, temperature) if cache else (None, None)
+    if hit is not None:
+        yield hit
+        return
+
+    client, slots = get_async_client()
+    chunks = []
+    attempt = 0
+    try:
+        async with slots:
+            while True:
+                async with client.stream("POST", GROQ_URL, headers=headers, json=payload, timeout=timeout) as response:
+                    if response.status_code in RETRY_STATUS_CODES and attempt < LLM_MAX_RETRIES:
+                        delay = _retry_delay(attempt, response)
+                    else:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                            if delta:
+                                chunks.append(delta)
+                                yield delta
+                        break
+                await asyncio.sleep(delay)
+                attempt += 1
+    except Exception as e:
+        print(f"[GroqClient] Streaming API error: {e}")
+        if chunks:
+            raise
+        return
+
+    text = "".join(chunks).strip()
+    if cache_key is not None and text:
+        llm_cache.put(cache_key, text)
+
+
+async def close_clients():
+    """Close pooled connections; called on application shutdown."""
+    global _sync_client
+    with _sync_client_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
+    entry = _async_clients.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[0].aclose()
 
 
 def has_api_key() -> bool:
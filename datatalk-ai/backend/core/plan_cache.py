@@ -0,0 +1,64 @@
+import os
+import re
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from core.llm_cache import LLMCache
+from models.ai_models import AnalyticMission
+
+PLAN_CACHE_PATH = Path(__file__).parent.parent / "storage" / "cache" / "plan_cache.sqlite"
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE_ENABLED", "1") not in ("0", "false", "False")
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", 30 * 24 * 3600))
+
+
+def canonical_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivially different phrasings share a plan."""
+    text = re.sub(r"[^\w\s%.-]", " ", question.lower())
+    text = re.sub(r"(?<!\d)[.-]|[.-](?!\d)", " ", text)
+    return " ".join(text.split())
+
+
+def schema_fingerprint(schema: Dict) -> str:
+    """Hash of the table's column names and types; any change to either invalidates cached plans."""
+    columns = [[name, info.get("type") if isinstance(info, dict) else str(info)] for name, info in schema.items()]
+    return hashlib.sha256(json.dumps(columns).encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """Maps (canonical question, schema fingerprint) to a previously executed mission and SQL.
+
+    Follow-up questions are only reused with the same preceding questions,
+    since intent classification reads the recent conversation.
+    """
+
+    def __init__(self, store: LLMCache):
+        self.store = store
+
+    def _key(self, question: str, schema: Dict, table: str, history: Optional[List[Dict]]) -> str:
+        previous = [canonical_question(h.get("q", "")) for h in (history or [])[-3:]]
+        payload = json.dumps([canonical_question(question), previous, schema_fingerprint(schema), table])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, question: str, schema: Dict, table: str = "main_data",
+            history: Optional[List[Dict]] = None) -> Optional[Tuple[AnalyticMission, str]]:
+        raw = self.store.get(self._key(question, schema, table, history))
+        if raw is None:
+            return None
+        try:
+            entry = json.loads(raw)
+            return AnalyticMission(**entry["mission"]), entry["sql"]
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def put(self, question: str, schema: Dict, mission: AnalyticMission, sql: str, table: str = "main_data",
+            history: Optional[List[Dict]] = None):
+        entry = {"mission": json.loads(mission.json()), "sql": sql}
+        self.store.put(self._key(question, schema, table, history), json.dumps(entry))
+
+    def stats(self) -> Dict:
+        return self.store.stats()
+
+
+# Singleton instance
+plan_cache = PlanCache(LLMCache(PLAN_CACHE_PATH, ttl=PLAN_CACHE_TTL)) if PLAN_CACHE_ENABLED else None
@@ -64,9 +64,9 @@ class DataProfiler:
                     })
         return sorted(correlations, key=lambda x: x["strength"], reverse=True)[:5]
 
-    def generate_ai_summary(self, profile_data: Dict[str, Any]) -> str:
+    def generate_ai_summary(self, profile_data: Dict[str, Any], timeout: float = 60) -> str:
         """Use LLM to generate a plain-English quality report."""
         system_prompt = "You are a Senior Data Analyst. Generate a concise, 3-bullet point 'Data Quality Summary' based on the following technical profiling results. Focus on potential issues and recommendations."
         user_content = f"PROFILING_DATA: {profile_data}"
         
-        return nvidia_complete(system_prompt, user_content, max_tokens=512, temperature=0.1)
+        return nvidia_complete(system_prompt, user_content, max_tokens=512, temperature=0.1, timeout=timeout)
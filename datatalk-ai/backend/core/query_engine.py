@@ -1,9 +1,9 @@
 import json
 import os
-import re
 from pathlib import Path
 from typing import Optional, List, Dict
 from core.nvidia_client import nvidia_complete, has_api_key
+from core.rule_engine import RuleBasedSQLEngine
 
 PROMPT_PATH = Path(__file__).parent.parent / "prompts" / "sql_generation.txt"
 
@@ -19,13 +19,15 @@ class QueryEngine:
         self.schema = schema_analyzer
         self.table = table_name
         self.conversation_history: List[Dict] = []
+        self.rules = RuleBasedSQLEngine(schema_analyzer, table_name)
 
     def generate_sql(
         self,
         question: str,
         schema_context: str,
         previous_error: Optional[str] = None,
-        previous_sql: Optional[str] = None
+        previous_sql: Optional[str] = None,
+        temperature: float = 0.1
     ) -> str:
 
         if not has_api_key():
@@ -52,7 +54,7 @@ USER QUESTION: {question}
 
 Return ONLY the SQL query, nothing else."""
 
-        sql = nvidia_complete(SQL_PROMPT, user_message, max_tokens=512, temperature=0.1)
+        sql = nvidia_complete(SQL_PROMPT, user_message, max_tokens=512, temperature=temperature)
         if not sql:
             return self._fallback_sql(question, schema_context)
 
@@ -60,45 +62,8 @@ Return ONLY the SQL query, nothing else."""
         return sql if sql else self._fallback_sql(question, schema_context)
 
     def _fallback_sql(self, question: str, schema_context: str) -> str:
-        q = question.lower()
-        table = self.table
-
-        col_matches = re.findall(r'"(\w+)":\s*"(\w+)"', schema_context)
-        numeric_cols = [c for c, t in col_matches if t in ("numeric", "integer", "float", "number")]
-        cat_cols = [c for c, t in col_matches if t in ("text", "categorical", "boolean", "string")]
-
-        if any(w in q for w in ["count", "how many", "total", "number of"]):
-            if cat_cols:
-                return f'SELECT "{cat_cols[0]}", COUNT(*) as count FROM {table} GROUP BY "{cat_cols[0]}" ORDER BY count DESC LIMIT 20'
-            return f'SELECT COUNT(*) as total_count FROM {table}'
-
-        if any(w in q for w in ["average", "avg", "mean"]):
-            if numeric_cols and cat_cols:
-                return f'SELECT "{cat_cols[0]}", AVG("{numeric_cols[0]}") as avg_value FROM {table} GROUP BY "{cat_cols[0]}" ORDER BY avg_value DESC LIMIT 20'
-            if numeric_cols:
-                return f'SELECT AVG("{numeric_cols[0]}") as average FROM {table}'
-
-        if any(w in q for w in ["sum", "total"]):
-            if numeric_cols and cat_cols:
-                return f'SELECT "{cat_cols[0]}", SUM("{numeric_cols[0]}") as total FROM {table} GROUP BY "{cat_cols[0]}" ORDER BY total DESC LIMIT 20'
-
-        if any(w in q for w in ["distribution", "breakdown", "split", "rate", "churn"]):
-            if cat_cols:
-                return f'SELECT "{cat_cols[0]}", COUNT(*) as count, ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER(), 2) as percentage FROM {table} GROUP BY "{cat_cols[0]}" ORDER BY count DESC'
-
-        if any(w in q for w in ["top", "highest", "most", "max"]):
-            if numeric_cols and cat_cols:
-                return f'SELECT "{cat_cols[0]}", "{numeric_cols[0]}" FROM {table} ORDER BY "{numeric_cols[0]}" DESC LIMIT 10'
-
-        if any(w in q for w in ["bottom", "lowest", "least", "min"]):
-            if numeric_cols and cat_cols:
-                return f'SELECT "{cat_cols[0]}", "{numeric_cols[0]}" FROM {table} ORDER BY "{numeric_cols[0]}" ASC LIMIT 10'
-
-        if any(w in q for w in ["correlation", "vs", "versus"]):
-            if len(numeric_cols) >= 2:
-                return f'SELECT "{numeric_cols[0]}", "{numeric_cols[1]}" FROM {table} LIMIT 50'
-
-        return f'SELECT * FROM {table} LIMIT 20'
+        plan = self.rules.translate(question, self.conversation_history)
+        return plan.inline_sql() if plan else f'SELECT * FROM {self.table} LIMIT 20'
 
     def detect_chart_type_from_sql(self, sql: str, question: str) -> str:
         sql_lower = sql.lower()
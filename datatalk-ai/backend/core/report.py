@@ -33,12 +33,12 @@ class ReportGenerator:
             pdf.cell(0, 10, f"Query {i+1}: {h.get('user_question')}", new_x="LMARGIN", new_y="NEXT")
             
             pdf.set_font("helvetica", "", 11)
-            pdf.multi_cell(0, 8, f"Answer: {h.get('answer', 'N/A')}")
+            pdf.multi_cell(0, 8, f"Answer: {h.get('answer', 'N/A')}", new_x="LMARGIN", new_y="NEXT")
             
             exec_sum = h.get("executive_summary")
             if exec_sum:
                 pdf.set_font("helvetica", "B", 11)
-                pdf.multi_cell(0, 8, f"Summary: [{exec_sum.get('risk_level')}] {exec_sum.get('key_finding')}")
+                pdf.multi_cell(0, 8, f"Summary: [{exec_sum.get('risk_level')}] {exec_sum.get('key_finding') or exec_sum.get('summary')}", new_x="LMARGIN", new_y="NEXT")
             
             pdf.ln(5)
             
@@ -0,0 +1,231 @@
+import os
+import time
+import uuid
+import asyncio
+import threading
+import functools
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Optional
+import duckdb
+
+
+def _physical_memory_mb(default: int = 4096) -> int:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return default
+
+
+CPU_COUNT = os.cpu_count() or 1
+# DuckDB worker threads per session database
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", max(1, CPU_COUNT // 2)))
+# Memory shared by all session databases; each gets an equal share within the per-session bounds
+DUCKDB_TOTAL_MEMORY_MB = int(os.getenv("DUCKDB_TOTAL_MEMORY_MB", _physical_memory_mb() // 2))
+DUCKDB_SESSION_MEMORY_MB = int(os.getenv("DUCKDB_SESSION_MEMORY_MB", 2048))
+DUCKDB_MIN_SESSION_MEMORY_MB = int(os.getenv("DUCKDB_MIN_SESSION_MEMORY_MB", 128))
+# Operators over the memory limit spill here instead of failing
+DUCKDB_TEMP_DIR = Path(os.getenv("DUCKDB_TEMP_DIR", Path(__file__).parent.parent / "storage" / "duckdb_tmp"))
+DUCKDB_MAX_TEMP_MB = int(os.getenv("DUCKDB_MAX_TEMP_MB", 4096))
+
+# Wall-clock budget for one query, including time spent waiting for a slot
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", 60))
+# Queries running at once across all sessions, and per session
+QUERY_MAX_CONCURRENT = int(os.getenv("QUERY_MAX_CONCURRENT", max(2, CPU_COUNT)))
+QUERY_MAX_PER_SESSION = int(os.getenv("QUERY_MAX_PER_SESSION", 2))
+
+
+class QueryCancelled(Exception):
+    """Raised when a query is interrupted by its time limit or by the caller."""
+
+
+class QueryTicket:
+    """Handle for interrupting a query from another thread or the event loop."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cursor = None
+        self.reason: Optional[str] = None
+
+    def attach(self, cursor):
+        with self._lock:
+            if self.reason is not None:
+                raise QueryCancelled(self.reason)
+            self._cursor = cursor
+
+    def detach(self):
+        with self._lock:
+            self._cursor = None
+
+    def cancel(self, reason: str = "Query cancelled"):
+        with self._lock:
+            if self.reason is None:
+                self.reason = reason
+            if self._cursor is not None:
+                self._cursor.interrupt()
+
+
+class ResourceGovernor:
+    """Shares CPU, memory and query slots fairly between session databases.
+
+    Every session database gets the same thread count and temp-directory
+    spill settings, and an equal share of DUCKDB_TOTAL_MEMORY_MB that is
+    rebalanced as sessions come and go. Queries run in a bounded number of
+    slots, at most QUERY_MAX_PER_SESSION of them for any one session, and
+    are interrupted when they exceed their wall-clock limit.
+    """
+
+    def __init__(self, max_concurrent: int = QUERY_MAX_CONCURRENT, max_per_session: int = QUERY_MAX_PER_SESSION):
+        self.max_concurrent = max_concurrent
+        self.max_per_session = max_per_session
+        self._slots = threading.Condition()
+        self._running: Dict[int, int] = {}
+        self._waiting = 0
+        self._databases = weakref.WeakValueDictionary()
+        self._memory_mb: Optional[int] = None
+        self.timeouts = 0
+        self.cancellations = 0
+
+    def configure(self, conn, name: Optional[str] = None):
+        """Apply thread and spill settings to a new session database and give it its share of memory.
+
+        Every database spills into a directory of its own: DuckDB names its
+        temp files the same way in every instance, so two databases sharing a
+        directory overwrite each other's spilled blocks. `name` only prefixes
+        the directory to make it recognisable.
+        """
+        # DuckDB creates the directory once something actually spills, and removes it on close,
+        # but it does not create missing parents
+        DUCKDB_TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        unique = uuid.uuid4().hex[:12]
+        temp_dir = DUCKDB_TEMP_DIR / (f"{name}-{unique}" if name else unique)
+        conn.execute(f"SET threads = {max(1, DUCKDB_THREADS)}")
+        conn.execute(f"SET temp_directory = '{temp_dir.as_posix()}'")
+        conn.execute(f"SET max_temp_directory_size = '{DUCKDB_MAX_TEMP_MB}MB'")
+        with self._slots:
+            self._databases[id(conn)] = conn
+            self._memory_mb = None
+        self.rebalance()
+
+    def forget(self, conn):
+        """Stop managing a session database that is being closed; its memory share goes to the rest."""
+        with self._slots:
+            self._databases.pop(id(conn), None)
+            self._memory_mb = None
+
+    def busy(self, owner) -> bool:
+        """Whether a query of `owner` is running right now."""
+        with self._slots:
+            return id(owner) in self._running
+
+    def session_memory_mb(self) -> int:
+        sessions = max(1, len(self._databases))
+        return max(DUCKDB_MIN_SESSION_MEMORY_MB, min(DUCKDB_SESSION_MEMORY_MB, DUCKDB_TOTAL_MEMORY_MB // sessions))
+
+    def rebalance(self):
+        with self._slots:
+            memory_mb = self.session_memory_mb()
+            if memory_mb == self._memory_mb:
+                return
+            self._memory_mb = memory_mb
+            databases = list(self._databases.values())
+        for conn in databases:
+            try:
+                conn.cursor().execute(f"SET memory_limit = '{memory_mb}MB'")
+            except duckdb.Error as e:
+                print(f"[ResourceGovernor] Could not set memory_limit: {e}")
+
+    @contextmanager
+    def run(self, owner, timeout: Optional[float] = QUERY_TIMEOUT, ticket: Optional[QueryTicket] = None):
+        """Hold a query slot for `owner` and yield a cursor that is interrupted after `timeout` seconds.
+
+        An interrupted query surfaces as QueryCancelled carrying the reason.
+        """
+        ticket = ticket or QueryTicket()
+        key = id(owner)
+        # Sessions that were closed since the last query leave memory to share out
+        self.rebalance()
+        started = time.monotonic()
+        self._acquire(key, timeout)
+        timer = None
+        try:
+            cursor = owner.cursor()
+            ticket.attach(cursor)
+            if timeout:
+                remaining = max(timeout - (time.monotonic() - started), 0.001)
+                timer = threading.Timer(remaining, self._expire, args=(ticket, timeout))
+                timer.daemon = True
+                timer.start()
+            try:
+                yield cursor
+            except duckdb.InterruptException:
+                if ticket.reason is None:
+                    raise
+                self.cancellations += 1
+                raise QueryCancelled(ticket.reason) from None
+        finally:
+            if timer is not None:
+                timer.cancel()
+            ticket.detach()
+            self._release(key)
+
+    def _expire(self, ticket: QueryTicket, timeout: float):
+        self.timeouts += 1
+        ticket.cancel(f"Query exceeded the {timeout:g}s time limit")
+
+    def _acquire(self, key: int, timeout: Optional[float]):
+        with self._slots:
+            self._waiting += 1
+            try:
+                ready = self._slots.wait_for(
+                    lambda: sum(self._running.values()) < self.max_concurrent
+                    and self._running.get(key, 0) < self.max_per_session,
+                    timeout=timeout,
+                )
+            finally:
+                self._waiting -= 1
+            if not ready:
+                self.timeouts += 1
+                raise QueryCancelled(f"No query slot became free within {timeout:g}s; the server is busy")
+            self._running[key] = self._running.get(key, 0) + 1
+
+    def _release(self, key: int):
+        with self._slots:
+            self._running[key] -= 1
+            if not self._running[key]:
+                del self._running[key]
+            self._slots.notify_all()
+
+    def stats(self) -> Dict:
+        with self._slots:
+            return {
+                "sessions": len(self._databases),
+                "running": sum(self._running.values()),
+                "waiting": self._waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_per_session": self.max_per_session,
+                "threads_per_session": DUCKDB_THREADS,
+                "memory_limit_mb": self.session_memory_mb(),
+                "timeouts": self.timeouts,
+                "cancellations": self.cancellations,
+            }
+
+
+async def run_interruptible(fn: Callable, *args, **kwargs):
+    """Run `fn(*args, ticket=..., **kwargs)` in a worker thread; cancelling the await interrupts the query.
+
+    Unlike run_in_threadpool, cancellation (a stage timeout or a client
+    disconnect) takes effect immediately instead of after the query returns.
+    """
+    ticket = QueryTicket()
+    future = asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, ticket=ticket, **kwargs))
+    try:
+        return await future
+    except asyncio.CancelledError:
+        ticket.cancel("Query cancelled")
+        raise
+
+
+# Singleton instance
+governor = ResourceGovernor()
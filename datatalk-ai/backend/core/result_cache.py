@@ -0,0 +1,118 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import pyarrow as pa
+
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_MB", 64)) * 1024 * 1024
+
+# Line and block comments in front of the first keyword, as LLM-written SQL often has
+LEADING_COMMENTS = re.compile(r"^(?:\s+|--[^\n]*(?:\n|$)|/\*.*?\*/)*", re.DOTALL)
+# Queries calling these give a different answer on every run and are never cached
+VOLATILE_FUNCTIONS = {"random", "setseed", "uuid", "gen_random_uuid", "now", "current_timestamp",
+                      "get_current_timestamp", "current_date", "today", "current_time", "nextval"}
+
+
+def _is_volatile(node) -> bool:
+    if isinstance(node, dict):
+        if node.get("function_name") in VOLATILE_FUNCTIONS or node.get("sample"):
+            return True
+        return any(_is_volatile(value) for value in node.values())
+    if isinstance(node, list):
+        return any(_is_volatile(item) for item in node)
+    return False
+
+
+def _normalize(node):
+    if isinstance(node, dict):
+        # Source offsets differ with whitespace; table names are case-insensitive
+        return {
+            key: value.lower() if key == "table_name" and isinstance(value, str) else _normalize(value)
+            for key, value in node.items() if key != "query_location"
+        }
+    if isinstance(node, list):
+        return [_normalize(item) for item in node]
+    return node
+
+
+def canonical_sql_key(conn, sql: str, params: Optional[List] = None) -> Optional[str]:
+    """Fingerprint of DuckDB's parse tree for `sql`, or None when the result must not be cached."""
+    try:
+        tree = json.loads(conn.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+    except Exception:
+        return None
+    if tree.get("error") or _is_volatile(tree["statements"]):
+        return None
+    payload = json.dumps([_normalize(tree["statements"]), params or []], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def strip_leading_comments(sql: str) -> str:
+    return LEADING_COMMENTS.sub("", sql, count=1)
+
+
+def is_read_only(conn, sql: str) -> bool:
+    """Whether `sql` is nothing but SELECTs, going by DuckDB's parser rather than the first keyword.
+
+    json_serialize_sql only accepts SELECT statements, so `WITH ... DELETE`
+    and anything DuckDB cannot parse count as possible writes.
+    """
+    try:
+        tree = json.loads(conn.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+    except Exception:
+        return False
+    return not tree.get("error")
+
+
+class ResultCache:
+    """LRU cache of query results as Arrow tables, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, pa.Table]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[pa.Table]:
+        with self._lock:
+            table = self._entries.get(key)
+            if table is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return table
+
+    def put(self, key: str, table: pa.Table):
+        # A single result larger than a quarter of the budget would flush everything else
+        if table.nbytes > self.max_bytes // 4:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old.nbytes
+            self._entries[key] = table
+            self.size_bytes += table.nbytes
+            while self.size_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= evicted.nbytes
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
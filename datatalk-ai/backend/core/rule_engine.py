@@ -0,0 +1,404 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from core.data_cleaner import quote_identifier
+from models.ai_models import AnalyticMission
+
+# Plans at or above this confidence are executed without asking the LLM
+RULE_ENGINE_MIN_CONFIDENCE = float(os.getenv("RULE_ENGINE_MIN_CONFIDENCE", 0.75))
+DEFAULT_TOP_N = 10
+MAX_GROUPS = 50
+
+RATE_WORDS = {"rate", "rates", "percentage", "percent", "proportion", "share", "ratio"}
+AVERAGE_WORDS = {"average", "avg", "mean"}
+SUM_WORDS = {"sum", "total"}
+COUNT_PHRASES = ("how many", "count", "number of")
+MAX_WORDS = {"max", "maximum", "highest", "largest", "most", "top", "biggest"}
+MIN_WORDS = {"min", "minimum", "lowest", "smallest", "least", "bottom", "fewest"}
+DISTRIBUTION_WORDS = {"distribution", "breakdown", "split"}
+GROUP_WORDS = {"by", "per", "each", "across", "within"}
+POSITIVE_VALUES = ("yes", "true", "1")
+NEGATIVE_VALUES = ("no", "false", "0")
+# "without a partner", "did not churn", "don't have dependents"
+NEGATION_WORDS = {"no", "not", "without", "non", "never", "don", "didn", "doesn", "isn", "aren", "haven", "hasn"}
+NEGATION_FILLERS = {"a", "an", "any", "t", "have", "has", "had", "do", "does", "did", "is", "are", "be", "been",
+                    "on", "in", "with", "using"}
+# What "total" counts when it does not name a measure: "total customers"
+ROW_NOUNS = {"customers", "customer", "records", "rows", "people", "users", "entries", "count", "number"}
+# Questions like these need reasoning the rules cannot do
+COMPLEX_MARKERS = ("why", "trend", "over time", "correlat", "relationship", "predict", "forecast", "versus", " vs ",
+                   "compare", "impact", "driver", "insight", "recommend", "explain", "should", "analy")
+FOLLOW_UP_MARKERS = ("and ", "what about", "how about", "same ", "those", "them", "that ", "it ", "instead")
+STOPWORDS = {
+    "what", "whats", "is", "are", "the", "a", "an", "of", "for", "in", "on", "with", "to", "show", "me", "give",
+    "list", "tell", "how", "many", "much", "which", "who", "do", "does", "did", "have", "has", "there", "all",
+    "customers", "customer", "records", "rows", "people", "users", "value", "values", "overall", "please", "i",
+    "we", "our", "and", "or", "where", "whose", "that", "this", "from", "at", "be", "was", "were", "by", "per",
+    "each", "across", "within", "top", "bottom", "number", "count", "data", "dataset", "table",
+}
+NEUTRAL_VALUES = {"yes", "no", "true", "false", "unknown", "none", "other", "n", "y", "0", "1"}
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in re.split(r"[^a-z0-9]+", str(text).lower()) if w]
+
+
+def _stem(word: str) -> str:
+    """Crude stemming so "customers" / "churned" match columns "customer" / "churn"."""
+    if len(word) > 4 and word.endswith("ed"):
+        return word[:-2]
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def _sql_literal(value) -> str:
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class RulePlan:
+    """A deterministic translation of a question: parameterized SQL plus how sure the rules are."""
+
+    def __init__(self, sql: str, params: List, confidence: float, intent: str, metric: Optional[str],
+                 aggregation: Optional[str], columns: List[str], chart_type: str, methodology: str):
+        self.sql = sql
+        self.params = params
+        self.confidence = round(confidence, 2)
+        self.intent = intent
+        self.metric = metric
+        self.aggregation = aggregation
+        self.columns = columns
+        self.chart_type = chart_type
+        self.methodology = methodology
+
+    def inline_sql(self) -> str:
+        """The SQL with its parameters written in as literals, for display and history."""
+        parts = self.sql.split("?")
+        return parts[0] + "".join(_sql_literal(p) + rest for p, rest in zip(self.params, parts[1:]))
+
+    def to_mission(self) -> AnalyticMission:
+        return AnalyticMission(
+            intent=self.intent,
+            target_columns=self.columns,
+            metric=self.metric,
+            aggregation_method=self.aggregation,
+            methodology=self.methodology,
+            recommended_chart_type=self.chart_type,
+        )
+
+
+class RuleBasedSQLEngine:
+    """Answers simple count / average / sum / rate / top-N / filter questions without an LLM.
+
+    Question words are matched against column names, data-dictionary
+    descriptions and categorical values from the session schema.
+    """
+
+    def __init__(self, schema_analyzer, table_name: str = "main_data", target_column: Optional[str] = None):
+        self.analyzer = schema_analyzer
+        self.table = table_name
+        self.target_column = target_column
+
+    # --- matching -------------------------------------------------------
+
+    def _column_type(self, name: str) -> str:
+        info = self.analyzer.schema.get(name)
+        return info.get("type", "unknown") if isinstance(info, dict) else str(info)
+
+    def _match_columns(self, words: List[str]) -> Dict[str, Tuple[float, int, int]]:
+        """Column -> (match strength, first word position, words used) for columns the question names."""
+        stemmed = [_stem(w) for w in words]
+        matches = {}
+        for name in self.analyzer.schema:
+            name_words = [_stem(w) for w in _words(name.replace("_", " "))]
+            compact = "".join(name_words)
+            best = None
+            # Whole name, either as separate words or run together ("monthly charges" -> monthlycharges)
+            for size in (3, 2, 1):
+                for i in range(len(stemmed) - size + 1):
+                    window = stemmed[i:i + size]
+                    if window == name_words or "".join(window) == compact:
+                        best = best or (1.0, i, size)
+            if best is None:
+                entry = (self.analyzer.data_dictionary or {}).get(name)
+                description = entry.get("description", "") if isinstance(entry, dict) else ""
+                content = {_stem(w) for w in _words(description)} - STOPWORDS
+                overlap = [i for i, w in enumerate(stemmed) if w in content and w not in STOPWORDS and len(w) > 3]
+                if len(overlap) >= 2:
+                    best = (0.6, overlap[0], 1)
+            if best:
+                matches[name] = best
+        return matches
+
+    def _match_values(self, question_text: str) -> Tuple[Dict[str, str], bool, Dict[str, str]]:
+        """Categorical values the question mentions, as column -> value, whether any were
+        ambiguous, and column -> the phrase that matched."""
+        found: Dict[str, List[Tuple[str, str]]] = {}
+        for name, info in self.analyzer.schema.items():
+            if not isinstance(info, dict) or info.get("type") not in ("categorical", "boolean"):
+                continue
+            for value in info.get("unique_values") or []:
+                phrase = " ".join(_words(value))
+                if not phrase or phrase in NEUTRAL_VALUES or len(phrase) < 3:
+                    continue
+                if f" {phrase} " in question_text:
+                    found.setdefault(phrase, []).append((name, value))
+
+        filters, ambiguous, accepted, phrases = {}, False, [], {}
+        # Longer phrases win ("no internet service" over "internet service")
+        for phrase in sorted(found, key=len, reverse=True):
+            if any(f" {phrase} " in f" {longer} " for longer in accepted):
+                continue
+            candidates = found[phrase]
+            if len(candidates) > 1:
+                ambiguous = True
+                continue
+            name, value = candidates[0]
+            if name not in filters:
+                filters[name] = value
+                phrases[name] = phrase
+                accepted.append(phrase)
+        return filters, ambiguous, phrases
+
+    def _positive_value(self, column: str) -> Optional[str]:
+        return self._value_in(column, POSITIVE_VALUES)
+
+    def _negative_value(self, column: str) -> Optional[str]:
+        return self._value_in(column, NEGATIVE_VALUES)
+
+    def _value_in(self, column: str, spellings) -> Optional[str]:
+        info = self.analyzer.schema.get(column) or {}
+        for value in info.get("unique_values") or []:
+            if str(value).strip().lower() in spellings:
+                return value
+        return None
+
+    @staticmethod
+    def _negated(words: List[str], pos: int) -> bool:
+        """Whether the words before position `pos` negate it: "not", "without a", "didn't"."""
+        i = pos - 1
+        while i >= 0 and words[i] in NEGATION_FILLERS:
+            i -= 1
+        return i >= 0 and words[i] in NEGATION_WORDS
+
+    @staticmethod
+    def _phrase_positions(words: List[str], phrase: str) -> List[int]:
+        size = len(phrase.split())
+        return [i for i in range(len(words) - size + 1) if " ".join(words[i:i + size]) == phrase]
+
+    # --- translation ----------------------------------------------------
+
+    def translate(self, question: str, history: Optional[List[Dict]] = None) -> Optional[RulePlan]:
+        words = _words(question)
+        if not words:
+            return None
+        text = f" {' '.join(words)} "
+        lowered = f" {question.lower().strip()} "
+        complex_question = any(m in lowered for m in COMPLEX_MARKERS)
+        # Follow-ups lean on the previous turn, which only the LLM reads
+        if history and any(lowered.lstrip().startswith(m) or f" {m}" in lowered for m in FOLLOW_UP_MARKERS):
+            return None
+
+        columns = self._match_columns(words)
+        filters, ambiguous_values, phrases = self._match_values(text)
+        # A value like "Fiber optic" filters its column; it does not make the column a measure or group
+        for name in filters:
+            if name in columns and columns[name][0] < 1.0:
+                del columns[name]
+        value_positions = set()
+        for phrase in phrases.values():
+            for start in self._phrase_positions(words, phrase):
+                # Filters are equalities; "not on fiber optic" needs the LLM
+                if self._negated(words, start):
+                    return None
+                value_positions.update(range(start, start + len(phrase.split())))
+        # Nor do words inside a matched value name another column ("no phone service" is not phoneservice)
+        for name, (_, pos, size) in list(columns.items()):
+            if name not in filters and all(i in value_positions for i in range(pos, pos + size)):
+                del columns[name]
+        negated = {name for name, (_, pos, _) in columns.items() if self._negated(words, pos)}
+        # Words that spell out a column name are not keywords ("total charges" is a column, not a SUM)
+        consumed = {i for strength, pos, size in columns.values() if strength == 1.0 for i in range(pos, pos + size)}
+        word_set = {w for i, w in enumerate(words) if i not in consumed}
+
+        top_match = re.search(r"\b(top|bottom|first|last)\s+(\d+)\b", question.lower())
+        limit = int(top_match.group(2)) if top_match else None
+
+        descending = not (top_match and top_match.group(1) in ("bottom", "last")) and not (word_set & MIN_WORDS)
+
+        # Group column: a categorical/boolean column named right after by/per/each/across
+        group = None
+        for name, (_, pos, _) in sorted(columns.items(), key=lambda c: c[1][1]):
+            if pos > 0 and words[pos - 1] in GROUP_WORDS and self._column_type(name) in ("categorical", "boolean", "text"):
+                group = name
+                break
+        total_pos = words.index("total") if "total" in words else None
+        counts_rows = total_pos is not None and (total_pos + 1 == len(words) or words[total_pos + 1] in ROW_NOUNS)
+        numeric = [n for n in columns if n != group and self._column_type(n) == "numeric"]
+        boolean = [n for n in columns if n != group and self._column_type(n) == "boolean"]
+        categorical = [n for n in columns if n != group and self._column_type(n) in ("categorical", "text")]
+
+        metric, measure = None, None
+        if word_set & RATE_WORDS or "%" in question:
+            metric = "rate"
+            target_is_boolean = self.target_column and self._column_type(self.target_column) == "boolean"
+            if target_is_boolean and (self.target_column in boolean or not boolean):
+                measure = self.target_column
+            else:
+                measure = boolean[0] if boolean else None
+        elif word_set & AVERAGE_WORDS:
+            metric, measure = "average", numeric[0] if numeric else None
+        elif word_set & SUM_WORDS and numeric and not any(p in text for p in COUNT_PHRASES):
+            metric, measure = "sum", numeric[0]
+        elif word_set & DISTRIBUTION_WORDS:
+            metric = "distribution"
+            group = group or (categorical or boolean or [None])[0]
+        elif any(f" {p} " in text for p in COUNT_PHRASES) or counts_rows:
+            metric = "count"
+        elif word_set & (MAX_WORDS | MIN_WORDS) and numeric:
+            metric, measure = ("max" if descending else "min"), numeric[0]
+        if metric is None:
+            return None
+        if metric in ("rate", "average", "sum", "max", "min") and measure is None:
+            return None
+        if metric == "distribution" and group is None:
+            return None
+        # "top 5 payment methods by churn rate": the column after "by" is what is measured, not the grouping
+        if group is not None and group == measure:
+            group = None
+            if not (limit or word_set & MAX_WORDS & {"top", "most"}):
+                return None
+        # "What percentage of customers have DSL?": the share of matching rows, not the target's rate among them
+        if metric == "rate" and measure == self.target_column and measure not in columns and filters:
+            metric, measure = "share", None
+        measure_value = None
+        if metric == "rate":
+            measure_value = self._negative_value(measure) if measure in negated else self._positive_value(measure)
+            if measure_value is None and measure in negated:
+                return None
+
+        # Other yes/no columns the question names narrow the rows: "churn rate for senior citizens"
+        inferred_filters = 0
+        for name in boolean:
+            value = self._negative_value(name) if name in negated else self._positive_value(name)
+            if name not in (measure, group) and name not in filters and value is not None:
+                filters[name] = value
+                inferred_filters += 1
+
+        # Implicit grouping: "top 5 paymentmethod by average monthlycharges"
+        if group is None and (limit or word_set & MAX_WORDS & {"top", "most"}) and metric != "max":
+            group = next((n for n in categorical if n != measure and n not in filters), None)
+            if group is None and metric in ("rate", "share"):
+                return None
+
+        sql, params = self._build_sql(metric, measure, group, filters, limit, descending, measure_value)
+
+        # --- confidence ---
+        confidence = 0.55
+        resolved = [c for c in (measure, group) if c]
+        strengths = [columns[c][0] if c in columns else 0.7 for c in resolved]
+        confidence += 0.3 * (min(strengths) if strengths else 0.8)
+        explained = {w for name in columns for w in _words(name.replace("_", " "))}
+        explained |= {w for value in filters.values() for w in _words(value)}
+        keywords = (RATE_WORDS | AVERAGE_WORDS | SUM_WORDS | MAX_WORDS | MIN_WORDS | DISTRIBUTION_WORDS | GROUP_WORDS
+                    | NEGATION_WORDS | NEGATION_FILLERS)
+        unexplained = [
+            w for w in words
+            if w not in STOPWORDS and w not in keywords and w not in explained and not w.isdigit()
+            and not any(w in name or _stem(w) in name for name in columns)
+        ]
+        confidence += 0.15 if not unexplained else -0.12 * len(unexplained)
+        if ambiguous_values:
+            confidence -= 0.2
+        confidence -= 0.05 * inferred_filters
+        if metric in ("average", "sum") and len(numeric) > 1:
+            confidence -= 0.2
+        if complex_question:
+            confidence = min(confidence, 0.4)
+        confidence = max(0.0, min(confidence, 1.0))
+
+        used = [c for c in (measure, group) if c] + [c for c in filters if c not in (measure, group)]
+        return RulePlan(
+            sql=sql,
+            params=params,
+            confidence=confidence,
+            intent="GROUP_COMPARISON" if group and metric != "distribution" else
+                   "DISTRIBUTION" if metric == "distribution" else "METRIC_CALCULATION",
+            metric=metric,
+            aggregation="group-by" if group else "filtering" if filters else "summation",
+            columns=used,
+            chart_type="bar_chart" if group and metric != "distribution" else
+                       "pie_chart" if metric == "distribution" else "metric_card",
+            methodology=self._describe(metric, measure, group, filters, measure_value),
+        )
+
+    def _build_sql(self, metric: str, measure: Optional[str], group: Optional[str], filters: Dict[str, str],
+                   limit: Optional[int], descending: bool, measure_value: Optional[str] = None) -> Tuple[str, List]:
+        params: List = []
+        if metric == "rate":
+            value = measure_value or "Yes"
+            expr = f"ROUND(AVG(CASE WHEN {quote_identifier(measure)} = ? THEN 1 ELSE 0 END) * 100, 2)"
+            alias = f"{measure}_rate_pct" if value == self._positive_value(measure) else f"{measure}_{value}_pct".lower()
+            params.append(value)
+            select = f"{expr} AS {quote_identifier(alias)}, COUNT(*) AS count"
+        elif metric == "share":
+            # The filters define the share instead of restricting the rows
+            condition = " AND ".join(f"{quote_identifier(col)} = ?" for col in filters)
+            alias = "share_pct"
+            select = (f"ROUND(AVG(CASE WHEN {condition} THEN 1 ELSE 0 END) * 100, 2) AS share_pct, "
+                      f"COUNT(*) FILTER (WHERE {condition}) AS count")
+            params.extend(list(filters.values()) * 2)
+            filters = {}
+        elif metric == "average":
+            alias = f"avg_{measure}"
+            select = f"ROUND(AVG({quote_identifier(measure)}), 2) AS {quote_identifier(alias)}"
+        elif metric == "sum":
+            alias = f"total_{measure}"
+            select = f"ROUND(SUM({quote_identifier(measure)}), 2) AS {quote_identifier(alias)}"
+        elif metric in ("max", "min"):
+            alias = f"{metric}_{measure}"
+            select = f"{metric.upper()}({quote_identifier(measure)}) AS {quote_identifier(alias)}"
+        elif metric == "distribution":
+            alias = "count"
+            select = "COUNT(*) AS count, ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) AS percentage"
+        else:
+            alias = "count"
+            select = "COUNT(*) AS count"
+
+        where = ""
+        if filters:
+            where = " WHERE " + " AND ".join(f"{quote_identifier(col)} = ?" for col in filters)
+            params.extend(filters.values())
+
+        if group:
+            g = quote_identifier(group)
+            order = "DESC" if descending else "ASC"
+            sql = (f"SELECT {g}, {select} FROM {self.table}{where} "
+                   f"GROUP BY {g} ORDER BY {quote_identifier(alias)} {order} LIMIT {limit or MAX_GROUPS}")
+        elif limit and measure and metric in ("max", "min"):
+            # "top 5 customers by tenure": the rows themselves
+            order = "DESC" if metric == "max" else "ASC"
+            sql = f"SELECT * FROM {self.table}{where} ORDER BY {quote_identifier(measure)} {order} LIMIT {limit}"
+        else:
+            sql = f"SELECT {select} FROM {self.table}{where}"
+        return sql, params
+
+    def _describe(self, metric: str, measure: Optional[str], group: Optional[str], filters: Dict[str, str],
+                  measure_value: Optional[str] = None) -> str:
+        condition = " and ".join(f"{c} = {v}" for c, v in filters.items())
+        what = {
+            "rate": f"share of rows where {measure} is {measure_value or 'positive'}, as a percentage",
+            "share": f"share of rows where {condition}, as a percentage",
+            "average": f"mean of {measure}",
+            "sum": f"sum of {measure}",
+            "max": f"maximum of {measure}",
+            "min": f"minimum of {measure}",
+            "distribution": "row count and percentage of the total",
+            "count": "row count",
+        }[metric]
+        parts = [what.capitalize()]
+        if filters and metric != "share":
+            parts.append("for rows where " + " and ".join(f"{c} = {v}" for c, v in filters.items()))
+        if group:
+            parts.append(f"per {group}")
+        return " ".join(parts) + "."
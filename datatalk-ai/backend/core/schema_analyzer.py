@@ -2,6 +2,7 @@ import json
 import os
 from pathlib import Path
 from core.nvidia_client import nvidia_complete, has_api_key
+from core.schema_context import SchemaContext
 
 PROMPT_PATH = Path(__file__).parent.parent / "prompts" / "data_dictionary.txt"
 
@@ -9,8 +10,13 @@ class SchemaAnalyzer:
     def __init__(self, schema):
         self.schema = schema
         self.data_dictionary = {}
+        self.context = SchemaContext(self)
 
-    def generate_data_dictionary(self):
+    def schema_context(self, question: str = None, max_tokens: int = None, include_dictionary: bool = False) -> str:
+        """Compact, question-ranked schema text for LLM prompts."""
+        return self.context.render(question, max_tokens=max_tokens, include_dictionary=include_dictionary)
+
+    def generate_data_dictionary(self, timeout: float = 60):
         try:
             system_prompt = PROMPT_PATH.read_text()
         except Exception:
@@ -26,7 +32,7 @@ class SchemaAnalyzer:
 
 Return ONLY valid JSON where each key is a column name with description and data_type_category."""
 
-        text = nvidia_complete(system_prompt, user_message, max_tokens=1500, temperature=0.1)
+        text = nvidia_complete(system_prompt, user_message, max_tokens=1500, temperature=0.1, timeout=timeout)
         if not text:
             self.data_dictionary = self._fallback_dict()
             return self.data_dictionary
@@ -0,0 +1,177 @@
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+# Rough prompt budget for the schema section; ~4 characters per token for English/SQL text
+SCHEMA_CONTEXT_TOKENS = int(os.getenv("SCHEMA_CONTEXT_TOKENS", 1200))
+CHARS_PER_TOKEN = 4
+MAX_LISTED_VALUES = 8
+MAX_VALUE_CHARS = 40
+MAX_RENDERED_CONTEXTS = 256
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _words(text: str) -> Set[str]:
+    return {w for w in re.split(r"[^a-z0-9]+", str(text).lower()) if w}
+
+
+def _phrase(text: str) -> str:
+    """Lowercased words joined by single spaces, so "Month-to-month" matches "month to month"."""
+    return " ".join(w for w in re.split(r"[^a-z0-9]+", str(text).lower()) if w)
+
+
+def _short(value) -> str:
+    text = str(value)
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS - 3] + "..."
+
+
+class SchemaContext:
+    """Renders a session's schema as compact prompt text within a token budget.
+
+    Columns are ranked by how well their names, values and dictionary
+    descriptions match the question. The best matches get a detail line
+    (type, range or values), the rest are listed by name and type only.
+    Rendered contexts are memoized until the schema or dictionary object
+    is replaced.
+    """
+
+    def __init__(self, analyzer, max_tokens: int = SCHEMA_CONTEXT_TOKENS):
+        self.analyzer = analyzer
+        self.max_tokens = max_tokens
+        self._source = None
+        self._lines: Dict[Tuple[str, bool], str] = {}
+        self._rendered: "OrderedDict[tuple, str]" = OrderedDict()
+        self._vocabulary: Dict[str, Dict[str, str]] = {}
+
+    def render(self, question: Optional[str] = None, max_tokens: Optional[int] = None,
+               include_dictionary: bool = False) -> str:
+        self._refresh()
+        budget = (max_tokens or self.max_tokens) * CHARS_PER_TOKEN
+        ranked, matched_values = self._rank(question or "")
+
+        key = (tuple(ranked), tuple((n, tuple(v)) for n, v in sorted(matched_values.items())), budget,
+               include_dictionary)
+        if key in self._rendered:
+            self._rendered.move_to_end(key)
+            return self._rendered[key]
+
+        # Keep room for the names of every column that does not get a detail line
+        reserve = sum(len(self._brief(name)) + 2 for name in ranked)
+        detailed = []
+        used = 0
+        for name in ranked:
+            line = self._detail_line(name, include_dictionary, matched_values.get(name))
+            reserve -= len(self._brief(name)) + 2
+            if used + len(line) + 1 + reserve > budget:
+                break
+            detailed.append(line)
+            used += len(line) + 1
+        brief = [self._brief(name) for name in ranked[len(detailed):]]
+
+        parts = ["COLUMNS:"] + detailed
+        if brief:
+            listing = ", ".join(brief)
+            if used + len(listing) > budget:
+                cut = listing[:max(budget - used, 0)].rsplit(", ", 1)[0]
+                listing = f"{cut}, ... ({len(brief) - cut.count(', ') - 1} more)"
+            parts.append(f"OTHER COLUMNS: {listing}")
+        text = "\n".join(parts)
+
+        self._rendered[key] = text
+        if len(self._rendered) > MAX_RENDERED_CONTEXTS:
+            self._rendered.popitem(last=False)
+        return text
+
+    def _refresh(self):
+        schema, dictionary = self.analyzer.schema, self.analyzer.data_dictionary
+        if self._source and self._source[0] is schema and self._source[1] is dictionary:
+            return
+        self._source = (schema, dictionary)
+        self._lines.clear()
+        self._rendered.clear()
+        self._vocabulary = {}
+        for name, info in self.analyzer.schema.items():
+            info = info if isinstance(info, dict) else {}
+            values = info.get("unique_values") or info.get("sample_values") or []
+            self._vocabulary[name] = {_phrase(v): str(v) for v in values if _phrase(v)}
+
+    def _rank(self, question: str) -> Tuple[List[str], Dict[str, List[str]]]:
+        """Columns ordered by relevance to the question, plus the values the question mentions per column."""
+        names = list(self.analyzer.schema)
+        if not question.strip():
+            return names, {}
+
+        q_words = _words(question)
+        q_text = f" {_phrase(question)} "
+        dictionary = self.analyzer.data_dictionary or {}
+
+        scores, matched_values = {}, {}
+        for position, name in enumerate(names):
+            name_words = _words(name.replace("_", " "))
+            score = 0.0
+            if name.lower() in q_words or f" {_phrase(name.replace('_', ' '))} " in q_text:
+                score += 10
+            score += 3 * len(name_words & q_words)
+            # Partial stems ("charge" vs "monthlycharges")
+            score += sum(1 for w in q_words if len(w) > 3 and w in name.lower())
+
+            hits = [v for p, v in self._vocabulary.get(name, {}).items() if f" {p} " in q_text]
+            if hits:
+                matched_values[name] = sorted(hits)
+                score += 5 * len(hits)
+
+            entry = dictionary.get(name)
+            if isinstance(entry, dict):
+                score += 0.5 * len(_words(entry.get("description", "")) & q_words)
+            # Stable order for ties: original column order
+            scores[name] = (score, -position)
+        ranked = sorted(names, key=lambda n: scores[n], reverse=True)
+        return ranked, matched_values
+
+    def _brief(self, name: str) -> str:
+        info = self.analyzer.schema.get(name)
+        kind = info.get("type", "unknown") if isinstance(info, dict) else str(info)
+        return f"{name} [{kind}]"
+
+    def _detail_line(self, name: str, include_dictionary: bool, matched: Optional[List[str]] = None) -> str:
+        cache_key = (name, include_dictionary)
+        line = self._lines.get(cache_key)
+        if line is None:
+            line = self._build_line(name, include_dictionary)
+            self._lines[cache_key] = line
+        if matched:
+            line += f" | mentioned: {', '.join(_short(v) for v in matched)}"
+        return line
+
+    def _build_line(self, name: str, include_dictionary: bool) -> str:
+        info = self.analyzer.schema.get(name)
+        if not isinstance(info, dict):
+            return f"- {self._brief(name)}"
+        kind = info.get("type", "unknown")
+        parts = [f"- {name} [{kind}]"]
+
+        if kind == "numeric":
+            parts.append(f"range {info.get('min')}..{info.get('max')}, mean {info.get('mean')}")
+        elif kind in ("categorical", "boolean"):
+            values = info.get("unique_values") or []
+            listed = ", ".join(_short(v) for v in values[:MAX_LISTED_VALUES])
+            more = f" (+{len(values) - MAX_LISTED_VALUES} more)" if len(values) > MAX_LISTED_VALUES else ""
+            parts.append(f"values {listed}{more}")
+        elif kind == "text":
+            samples = info.get("sample_values") or []
+            parts.append(f"{info.get('unique_count')} distinct, e.g. {', '.join(_short(v) for v in samples[:3])}")
+        elif kind == "id":
+            parts.append(f"{info.get('unique_count')} distinct")
+
+        if info.get("null_count"):
+            parts.append(f"{info['null_count']} nulls")
+
+        if include_dictionary:
+            entry = (self.analyzer.data_dictionary or {}).get(name)
+            if isinstance(entry, dict) and entry.get("description"):
+                parts.append(entry["description"])
+        return ": ".join(parts[:2]) + "".join(f"; {p}" for p in parts[2:])
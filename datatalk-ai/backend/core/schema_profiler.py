@@ -0,0 +1,121 @@
+import os
+from typing import Dict, List, Optional
+from core.data_cleaner import quote_identifier, is_numeric_sql_type
+
+# Tables with more rows than this are profiled with approx_count_distinct / approx_quantile
+APPROX_PROFILE_THRESHOLD = int(os.getenv("APPROX_PROFILE_THRESHOLD", 10_000_000))
+
+ID_KEYWORDS = ["id", "uuid", "key", "code", "customerid", "userid", "orderid"]
+BOOLEAN_PAIRS = [
+    {"yes", "no"},
+    {"true", "false"},
+    {"0", "1"},
+    {"y", "n"},
+]
+CATEGORICAL_MAX_UNIQUE = 30
+
+
+class SchemaProfiler:
+    """Builds the column `schema` dict for a DuckDB table from set-based SQL scans."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def profile(self, table_name: str, approximate: Optional[bool] = None) -> Dict:
+        columns = [(row[0], row[1]) for row in self.conn.execute(f"DESCRIBE {table_name}").fetchall()]
+        if not columns:
+            return {}
+        if approximate is None:
+            row_count = self.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+            approximate = row_count > APPROX_PROFILE_THRESHOLD
+
+        stats = self._scan_aggregates(table_name, columns, approximate)
+
+        # Value counts are only needed for low-cardinality columns; fetch them all in one more scan
+        low_cardinality = [
+            (i, name) for i, (name, _) in enumerate(columns)
+            if stats[f"u{i}"] <= CATEGORICAL_MAX_UNIQUE and not self._is_id_column(name, stats[f"u{i}"])
+        ]
+        histograms = self._scan_histograms(table_name, low_cardinality)
+
+        schema = {}
+        text_columns = []
+        for i, (name, sql_type) in enumerate(columns):
+            unique_count = int(stats[f"u{i}"])
+            col_info = {
+                "null_count": int(stats[f"n{i}"]),
+                "unique_count": unique_count,
+            }
+            # Most frequent first, like pandas value_counts
+            top_values = sorted(histograms.get(i, {}).items(), key=lambda kv: kv[1], reverse=True)
+
+            if self._is_id_column(name, unique_count):
+                col_info["type"] = "id"
+
+            elif is_numeric_sql_type(sql_type):
+                col_info["type"] = "numeric"
+                for key in ["min", "max", "mean", "median", "std"]:
+                    value = stats[f"{key}{i}"]
+                    col_info[key] = round(float(value), 2) if value is not None else None
+
+            elif self._is_boolean_column(top_values):
+                col_info["type"] = "boolean"
+                col_info["unique_values"] = [v for v, _ in top_values]
+                col_info["value_counts"] = {str(v): int(c) for v, c in top_values}
+
+            elif unique_count <= CATEGORICAL_MAX_UNIQUE:
+                col_info["type"] = "categorical"
+                col_info["unique_values"] = [v for v, _ in top_values]
+                col_info["value_counts"] = {str(v): int(c) for v, c in top_values[:20]}
+
+            else:
+                col_info["type"] = "text"
+                text_columns.append(name)
+
+            schema[name] = col_info
+
+        for name, values in self._sample_values(table_name, text_columns).items():
+            schema[name]["sample_values"] = values
+
+        return schema
+
+    def _scan_aggregates(self, table_name: str, columns: List, approximate: bool) -> Dict:
+        exprs = []
+        for i, (name, sql_type) in enumerate(columns):
+            col = quote_identifier(name)
+            distinct = f"approx_count_distinct({col})" if approximate else f"COUNT(DISTINCT {col})"
+            exprs += [f"COUNT(*) - COUNT({col}) AS n{i}", f"{distinct} AS u{i}"]
+            if is_numeric_sql_type(sql_type):
+                median = f"approx_quantile({col}, 0.5)" if approximate else f"MEDIAN({col})"
+                exprs += [
+                    f"MIN({col}) AS min{i}",
+                    f"MAX({col}) AS max{i}",
+                    f"AVG({col}) AS mean{i}",
+                    f"{median} AS median{i}",
+                    f"STDDEV_SAMP({col}) AS std{i}",
+                ]
+        cursor = self.conn.execute(f"SELECT {', '.join(exprs)} FROM {table_name}")
+        return dict(zip([d[0] for d in cursor.description], cursor.fetchone()))
+
+    def _scan_histograms(self, table_name: str, columns: List) -> Dict[int, Dict]:
+        if not columns:
+            return {}
+        exprs = [f"histogram({quote_identifier(name)}) AS h{i}" for i, name in columns]
+        row = self.conn.execute(f"SELECT {', '.join(exprs)} FROM {table_name}").fetchone()
+        return {i: hist or {} for (i, _), hist in zip(columns, row)}
+
+    def _sample_values(self, table_name: str, columns: List[str], n: int = 5) -> Dict[str, List]:
+        samples = {}
+        for name in columns:
+            col = quote_identifier(name)
+            rows = self.conn.execute(f"SELECT {col} FROM {table_name} WHERE {col} IS NOT NULL LIMIT {n}").fetchall()
+            samples[name] = [row[0] for row in rows]
+        return samples
+
+    def _is_id_column(self, col_name: str, unique_count: int) -> bool:
+        col_lower = col_name.lower()
+        return any(kw in col_lower for kw in ID_KEYWORDS) and unique_count > 100
+
+    def _is_boolean_column(self, top_values: List) -> bool:
+        unique_vals = set(str(v).strip().lower() for v, _ in top_values)
+        return any(unique_vals == pair for pair in BOOLEAN_PAIRS)
@@ -0,0 +1,212 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+from core.resource_governor import governor
+
+# Memory all resident sessions may use together, and how many may stay resident at once
+SESSION_MEMORY_BUDGET_BYTES = int(os.getenv("SESSION_MEMORY_BUDGET_MB", 2048)) * 1024 * 1024
+MAX_ACTIVE_SESSIONS = int(os.getenv("MAX_ACTIVE_SESSIONS", 64))
+# Sessions used this recently are never evicted, so in-flight requests keep their connection
+SESSION_MIN_IDLE_SECONDS = float(os.getenv("SESSION_MIN_IDLE_SECONDS", 60))
+# Footprints are re-measured at most this often on lookups; inserts always measure
+SESSION_CHECK_INTERVAL = float(os.getenv("SESSION_CHECK_INTERVAL", 5))
+MAX_TRACKED_EVICTIONS = 1000
+
+
+class SessionManager:
+    """LRU store of active sessions, bounded by their measured memory footprint.
+
+    Behaves like the dict it replaces (`in`, `[]`, `[]=`, `get`, `pop`).
+    A session's footprint is its DuckDB memory (`duckdb_memory()`) plus
+    its cached query results; sessions sharing one database file count it
+    once. When the total exceeds the budget, or there are more than
+    MAX_ACTIVE_SESSIONS, the least recently used idle sessions are
+    evicted: in-memory databases are first spilled to `spill_dir`, then
+    the connection is closed. Evicted sessions are restored lazily by
+    whoever looks them up next (get_active_session).
+
+    Measuring, spilling and closing happen outside the manager's lock, so
+    lookups never wait behind a large spill. A per-session lock (`lock`)
+    keeps a session from being restored while it is still being spilled,
+    and concurrent lookups of an evicted session from restoring it twice.
+    """
+
+    def __init__(self, spill_dir: Path, budget_bytes: int = SESSION_MEMORY_BUDGET_BYTES,
+                 max_sessions: int = MAX_ACTIVE_SESSIONS, min_idle: float = SESSION_MIN_IDLE_SECONDS):
+        self.spill_dir = Path(spill_dir)
+        self.budget_bytes = budget_bytes
+        self.max_sessions = max_sessions
+        self.min_idle = min_idle
+        self._sessions: "OrderedDict[str, dict]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._footprints: Dict[str, int] = {}
+        self._evicted: "OrderedDict[str, float]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._session_locks: Dict[str, threading.Lock] = {}
+        self._enforcing = threading.Lock()
+        self._last_check = 0.0
+        self.evictions = 0
+        self.restores = 0
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __getitem__(self, session_id: str) -> dict:
+        with self._lock:
+            session = self._sessions[session_id]
+            self._sessions.move_to_end(session_id)
+            self._last_used[session_id] = time.monotonic()
+        if time.monotonic() - self._last_check > SESSION_CHECK_INTERVAL:
+            self.enforce()
+        return session
+
+    def __setitem__(self, session_id: str, session: dict):
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            self._last_used[session_id] = time.monotonic()
+            if self._evicted.pop(session_id, None) is not None:
+                self.restores += 1
+        self.enforce()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str, default=None) -> Optional[dict]:
+        try:
+            return self[session_id]
+        except KeyError:
+            return default
+
+    def pop(self, session_id: str, default=None) -> Optional[dict]:
+        with self._lock:
+            self._last_used.pop(session_id, None)
+            self._footprints.pop(session_id, None)
+            return self._sessions.pop(session_id, default)
+
+    def lock(self, session_id: str) -> threading.Lock:
+        """Held while a session is restored or evicted."""
+        with self._lock:
+            return self._session_locks.setdefault(session_id, threading.Lock())
+
+    @contextmanager
+    def pinned(self, session_id: str):
+        """Keep a session resident for the duration of a long-running background job."""
+        with self._lock:
+            self._pins[session_id] = self._pins.get(session_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins[session_id] -= 1
+                if not self._pins[session_id]:
+                    del self._pins[session_id]
+
+    @staticmethod
+    def _storage_key(session: dict):
+        db = session["db"]
+        return db.db_path or id(db)
+
+    def enforce(self):
+        """Measure every resident session and evict idle ones, oldest first, until within budget.
+
+        Only one thread enforces at a time; others skip instead of queueing behind it.
+        """
+        if not self._enforcing.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                self._last_check = time.monotonic()
+                resident = list(self._sessions.items())
+            # duckdb_memory() on every session is not free; measure without blocking lookups
+            footprints = {session_id: session["db"].memory_usage() for session_id, session in resident}
+            with self._lock:
+                self._footprints.update(
+                    (session_id, size) for session_id, size in footprints.items() if session_id in self._sessions)
+                victims = self._choose_victims()
+            for session_id, session, session_lock in victims:
+                try:
+                    self._close(session_id, session)
+                finally:
+                    session_lock.release()
+        finally:
+            self._enforcing.release()
+
+    def _choose_victims(self):
+        """Detach idle sessions, oldest first, until within budget; returns them with their lock held."""
+        users: Dict = {}
+        for session in self._sessions.values():
+            key = self._storage_key(session)
+            users[key] = users.get(key, 0) + 1
+        total = sum(self._footprints.get(sid, 0) for sid, key in self._first_per_storage())
+
+        victims = []
+        now = time.monotonic()
+        for session_id in list(self._sessions):
+            if total <= self.budget_bytes and len(self._sessions) <= self.max_sessions:
+                break
+            session = self._sessions[session_id]
+            if (now - self._last_used.get(session_id, 0) < self.min_idle or session_id in self._pins
+                    or governor.busy(session["db"])):
+                continue
+            # Never wait here: whoever holds a session's lock may be waiting for the manager's
+            session_lock = self.lock(session_id)
+            if not session_lock.acquire(blocking=False):
+                continue
+            key = self._storage_key(session)
+            users[key] -= 1
+            # A database file shared with another resident session stays open for it
+            if not users[key]:
+                total -= self._footprints.get(session_id, 0)
+            self.pop(session_id)
+            self._evicted[session_id] = time.time()
+            while len(self._evicted) > MAX_TRACKED_EVICTIONS:
+                forgotten, _ = self._evicted.popitem(last=False)
+                forgotten_lock = self._session_locks.get(forgotten)
+                if forgotten_lock is not None and not forgotten_lock.locked():
+                    del self._session_locks[forgotten]
+            self.evictions += 1
+            victims.append((session_id, session, session_lock))
+        return victims
+
+    def _first_per_storage(self):
+        seen = set()
+        for session_id, session in self._sessions.items():
+            key = self._storage_key(session)
+            if key not in seen:
+                seen.add(key)
+                yield session_id, key
+
+    def _close(self, session_id: str, session: dict):
+        db = session["db"]
+        try:
+            if not db.db_path:
+                db.spill(str(self.spill_dir / f"{session_id}.duckdb"))
+            db.close()
+        except Exception as e:
+            print(f"[SessionManager] Could not spill session {session_id}: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = sum(self._footprints.get(sid, 0) for sid, _ in self._first_per_storage())
+            return {
+                "resident": len(self._sessions),
+                "evicted": len(self._evicted),
+                "memory_bytes": total,
+                "budget_bytes": self.budget_bytes,
+                "max_sessions": self.max_sessions,
+                "evictions": self.evictions,
+                "restores": self.restores,
+                "sessions": [
+                    {"session_id": sid, "memory_bytes": self._footprints.get(sid, 0),
+                     "idle_seconds": round(time.monotonic() - self._last_used.get(sid, 0), 1)}
+                    for sid in reversed(self._sessions)
+                ],
+                "evicted_sessions": list(self._evicted)[-20:],
+            }
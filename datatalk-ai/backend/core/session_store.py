@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SESSION_STORE_PATH = Path(os.getenv(
+    "SESSION_STORE_PATH", Path(__file__).parent.parent / "storage" / "sessions.sqlite"))
+# Imported once into an empty store, then left in place as a backup
+LEGACY_SESSIONS_FILE = Path(__file__).parent.parent / "storage" / "sessions.json"
+# Query history entries returned with a session record, newest kept
+SESSION_HISTORY_LIMIT = int(os.getenv("SESSION_HISTORY_LIMIT", 1000))
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=str)
+
+
+class SessionStore:
+    """Session metadata in SQLite: one row per session and one per query-history entry.
+
+    Replaces storage/sessions.json, which was read and rewritten whole on
+    every access. Lookups go through the primary key, history appends are
+    single inserts, and read-modify-write updates run in an immediate
+    transaction so concurrent writers (including other worker processes)
+    cannot lose each other's changes.
+    """
+
+    def __init__(self, path: Path = SESSION_STORE_PATH, legacy_file: Optional[Path] = LEGACY_SESSIONS_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY, record TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_created_at ON sessions (created_at)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS query_history ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, query_id TEXT,"
+            " created_at REAL NOT NULL, entry TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS query_history_session ON query_history (session_id, id)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS query_results ("
+            " session_id TEXT NOT NULL, query_id TEXT NOT NULL, sql TEXT NOT NULL, params TEXT,"
+            " PRIMARY KEY (session_id, query_id))"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        if legacy_file is not None:
+            self.migrate_json(Path(legacy_file))
+
+    @contextmanager
+    def _transaction(self):
+        """Serialize writers across threads and processes; rolls back if the body raises."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone() is not None
+
+    def get(self, session_id: str, with_history: bool = True) -> Optional[Dict]:
+        """The session record, with its query history under "query_history" unless `with_history` is False."""
+        with self._lock:
+            row = self._db.execute("SELECT record FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            record = json.loads(row[0])
+            if with_history:
+                record["query_history"] = self._history(session_id)
+        return record
+
+    def latest(self) -> Optional[Dict]:
+        """The most recently created session record, without its history."""
+        with self._lock:
+            row = self._db.execute("SELECT record FROM sessions ORDER BY created_at DESC LIMIT 1").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, session_id: str, record: Dict):
+        """Create or replace a session record; a "query_history" list in it replaces the stored history."""
+        record = dict(record)
+        history = record.pop("query_history", None)
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO sessions (session_id, record, created_at, updated_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (session_id) DO UPDATE SET record = excluded.record, updated_at = excluded.updated_at",
+                (session_id, _dumps(record), now, now),
+            )
+            if history is not None:
+                db.execute("DELETE FROM query_history WHERE session_id = ?", (session_id,))
+                self._insert_history(db, session_id, history, now)
+
+    def update(self, session_id: str, fields: Dict) -> bool:
+        """Merge `fields` into a session record atomically; False if the session does not exist."""
+        fields = {k: v for k, v in fields.items() if k != "query_history"}
+        with self._transaction() as db:
+            row = db.execute("SELECT record FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return False
+            record = json.loads(row[0])
+            record.update(fields)
+            db.execute(
+                "UPDATE sessions SET record = ?, updated_at = ? WHERE session_id = ?",
+                (_dumps(record), time.time(), session_id),
+            )
+        return True
+
+    def append_history(self, session_id: str, entry: Dict):
+        with self._transaction() as db:
+            self._insert_history(db, session_id, [entry], time.time())
+
+    def history(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            return self._history(session_id)
+
+    def put_result(self, session_id: str, query_id: str, sql: str, params: Optional[List] = None):
+        """Keep the SQL behind an answered query, including batch questions that have no history entry."""
+        with self._transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO query_results (session_id, query_id, sql, params) VALUES (?, ?, ?, ?)",
+                (session_id, query_id, sql, _dumps(params)),
+            )
+
+    def result(self, session_id: str, query_id: str) -> Optional[Dict]:
+        """{"sql", "params"} of an answered query, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sql, params FROM query_results WHERE session_id = ? AND query_id = ?", (session_id, query_id)
+            ).fetchone()
+        return {"sql": row[0], "params": json.loads(row[1])} if row else None
+
+    def _history(self, session_id: str) -> List[Dict]:
+        rows = self._db.execute(
+            "SELECT entry FROM query_history WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_id, SESSION_HISTORY_LIMIT),
+        ).fetchall()
+        return [json.loads(entry) for (entry,) in reversed(rows)]
+
+    @staticmethod
+    def _insert_history(db, session_id: str, entries: List[Dict], now: float):
+        db.executemany(
+            "INSERT INTO query_history (session_id, query_id, created_at, entry) VALUES (?, ?, ?, ?)",
+            [(session_id, entry.get("query_id"), now, _dumps(entry)) for entry in entries],
+        )
+
+    def migrate_json(self, path: Path) -> int:
+        """Import a sessions.json file once; sessions already in the store are kept. Returns sessions imported."""
+        key = f"migrated:{path.resolve()}"
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return 0
+        try:
+            with open(path) as f:
+                sessions = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            print(f"[SessionStore] Could not read {path}: {e}")
+            return 0
+
+        imported = 0
+        now = time.time()
+        with self._transaction() as db:
+            # Keep the file's order so latest() still finds its last session
+            for n, (session_id, record) in enumerate(sessions.items()):
+                record = dict(record)
+                history = record.pop("query_history", None) or []
+                created = db.execute(
+                    "INSERT OR IGNORE INTO sessions (session_id, record, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                    (session_id, _dumps(record), now - len(sessions) + n, now),
+                ).rowcount
+                if created:
+                    self._insert_history(db, session_id, history, now)
+                    imported += 1
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(now)))
+        print(f"[SessionStore] Imported {imported} sessions from {path}")
+        return imported
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "sessions": self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0],
+                "history_entries": self._db.execute("SELECT COUNT(*) FROM query_history").fetchone()[0],
+                "results": self._db.execute("SELECT COUNT(*) FROM query_results").fetchone()[0],
+                "path": str(self.path),
+            }
+
+
+# Singleton instance
+session_store = SessionStore()
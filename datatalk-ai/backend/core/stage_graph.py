@@ -0,0 +1,95 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+
+class Stage:
+    """One step of a StageGraph.
+
+    `fn` receives the results of the stages listed in `depends_on` as keyword
+    arguments and returns an awaitable. Optional stages that fail, time out or
+    are skipped resolve to `default` instead of failing the whole graph.
+    """
+
+    def __init__(self, name: str, fn: Callable[..., Awaitable[Any]], depends_on: Iterable[str] = (),
+                 timeout: Optional[float] = None, optional: bool = False, default: Any = None):
+        self.name = name
+        self.fn = fn
+        self.depends_on = list(depends_on)
+        self.timeout = timeout
+        self.optional = optional
+        self.default = default
+
+
+class StageGraph:
+    """Runs stages as soon as their dependencies finish, so independent stages overlap."""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            missing = [d for d in stage.depends_on if d not in self.stages]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on undeclared stage(s): {', '.join(missing)}")
+            self.stages[stage.name] = stage
+        self.report: Dict[str, Dict[str, Any]] = {}
+        self._on_complete = None
+
+    async def run(self, skip: Iterable[str] = (),
+                  on_complete: Optional[Callable[[str, Any], Awaitable[None]]] = None) -> Dict[str, Any]:
+        """Run every stage and return their results by name.
+
+        Names in `skip` are only honoured for optional stages. The first
+        required stage to fail cancels the rest and its exception propagates.
+        `on_complete(name, result)` is awaited as each stage resolves,
+        including optional stages that fell back to their default.
+        """
+        skip = set(skip)
+        self.report = {}
+        self._on_complete = on_complete
+        tasks: Dict[str, asyncio.Task] = {}
+        for name, stage in self.stages.items():
+            deps = {d: tasks[d] for d in stage.depends_on}
+            tasks[name] = asyncio.ensure_future(self._run_stage(stage, deps, stage.optional and name in skip))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return {name: task.result() for name, task in tasks.items()}
+
+    async def _run_stage(self, stage: Stage, deps: Dict[str, asyncio.Task], skipped: bool) -> Any:
+        result = await self._resolve_stage(stage, deps, skipped)
+        if self._on_complete is not None:
+            await self._on_complete(stage.name, result)
+        return result
+
+    async def _resolve_stage(self, stage: Stage, deps: Dict[str, asyncio.Task], skipped: bool) -> Any:
+        inputs = dict(zip(deps, await asyncio.gather(*deps.values())))
+        if skipped:
+            self.report[stage.name] = {"status": "skipped", "duration_ms": 0}
+            return stage.default
+
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(stage.fn(**inputs), timeout=stage.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status = "timeout" if isinstance(e, asyncio.TimeoutError) else "failed"
+            self.report[stage.name] = {
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                "error": str(e) or status,
+            }
+            if not stage.optional:
+                if status == "timeout":
+                    raise asyncio.TimeoutError(f"Stage '{stage.name}' timed out") from e
+                raise
+            print(f"[StageGraph] Optional stage '{stage.name}' {status}: {e or status}")
+            return stage.default
+
+        self.report[stage.name] = {"status": "done", "duration_ms": round((time.perf_counter() - start) * 1000, 1)}
+        return result
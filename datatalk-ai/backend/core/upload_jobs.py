@@ -0,0 +1,84 @@
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Enrichment stages that run after the table is loaded, in execution order
+UPLOAD_STAGES = ["load", "profiling", "ai_summary", "data_dictionary", "impact_scores", "auto_insights"]
+MAX_TRACKED_JOBS = 500
+
+
+class UploadJob:
+    """Tracks the stages of one upload's background pipeline."""
+
+    def __init__(self, session_id: str, stages: List[str] = UPLOAD_STAGES):
+        self.session_id = session_id
+        self.stages = {
+            name: {"status": "pending", "started_at": None, "finished_at": None, "error": None}
+            for name in stages
+        }
+        self.result: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def start(self, stage: str):
+        with self._lock:
+            self.stages[stage].update(status="running", started_at=datetime.now().isoformat())
+
+    def finish(self, stage: str, **result):
+        with self._lock:
+            if self.stages[stage]["status"] == "failed":
+                # Already given up on (e.g. timed out); a late result does not revive the stage
+                return
+            self.stages[stage].update(status="done", finished_at=datetime.now().isoformat())
+            self.result.update(result)
+
+    def fail(self, stage: str, error: str):
+        with self._lock:
+            self.stages[stage].update(status="failed", finished_at=datetime.now().isoformat(), error=error)
+
+    def skip(self, stage: str, reason: str = "cached", **result):
+        with self._lock:
+            now = datetime.now().isoformat()
+            self.stages[stage].update(status=reason, started_at=now, finished_at=now)
+            self.result.update(result)
+
+    @property
+    def status(self) -> str:
+        states = [s["status"] for s in self.stages.values()]
+        if any(s in ("pending", "running") for s in states):
+            return "running"
+        return "completed_with_errors" if "failed" in states else "completed"
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {name: dict(info) for name, info in self.stages.items()}
+            result = dict(self.result)
+        finished = sum(1 for s in stages.values() if s["status"] not in ("pending", "running"))
+        return {
+            "session_id": self.session_id,
+            "status": self.status,
+            "progress": round(finished / len(stages), 2),
+            "stages": stages,
+            "result": result,
+        }
+
+
+class UploadJobRegistry:
+    def __init__(self):
+        self._jobs: Dict[str, UploadJob] = {}
+
+    def create(self, session_id: str) -> UploadJob:
+        # Forget the oldest finished jobs; their final state is persisted on the session record
+        finished = [sid for sid, job in self._jobs.items() if job.status != "running"]
+        for sid in finished[:max(0, len(self._jobs) - MAX_TRACKED_JOBS + 1)]:
+            del self._jobs[sid]
+
+        job = UploadJob(session_id)
+        self._jobs[session_id] = job
+        return job
+
+    def get(self, session_id: str) -> Optional[UploadJob]:
+        return self._jobs.get(session_id)
+
+
+# Singleton instance
+upload_jobs = UploadJobRegistry()
@@ -1,50 +1,52 @@
-import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from core.nvidia_client import has_api_key
+
+# Candidate SQLs requested in parallel on the first attempt; 1 keeps the one-at-a-time loop
+VALIDATOR_CANDIDATES = int(os.getenv("VALIDATOR_CANDIDATES", 1))
+# Sampling temperature per candidate; the first matches the single-shot generation
+CANDIDATE_TEMPERATURES = (0.1, 0.4, 0.7, 0.9)
+CANDIDATE_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("CANDIDATE_WORKERS", 8)),
+                                    thread_name_prefix="sql-candidates")
+FORBIDDEN_KEYWORDS = ["drop ", "delete ", "insert ", "update ", "truncate ", "alter "]
+
 
 class QueryValidator:
-    def __init__(self, db, query_engine, analyzer, max_retries=3):
+    def __init__(self, db, query_engine, analyzer, max_retries=3, candidates=VALIDATOR_CANDIDATES):
         self.db = db
         self.qe = query_engine
         self.analyzer = analyzer
         self.max_retries = max_retries
+        self.candidates = max(1, min(candidates, len(CANDIDATE_TEMPERATURES)))
 
     def execute_with_retry(self, question):
         audit_trail = []
         error = None
         sql = None
         result = None
-        
-        schema_context = f"Schema:\n{json.dumps(self.analyzer.schema, indent=2)}\n\nData Dictionary:\n{json.dumps(self.analyzer.data_dictionary, indent=2)}"
+
+        schema_context = f"Schema:\n{self.analyzer.schema_context(question, include_dictionary=True)}"
         relevant_cols = list(self.analyzer.schema.keys())
 
-        attempt = 1
-        for attempt in range(1, self.max_retries + 1):
-            sql = self.qe.generate_sql(question, schema_context, previous_error=error, previous_sql=sql)
-            audit_trail.append({"step": f"Attempt {attempt}", "detail": f"Generated SQL: {sql}"})
-            
-            if sql.strip() == "UNANSWERABLE":
-                error = "UNANSWERABLE"
-                break
-                
-            sql_lower = sql.lower().strip()
-            if not sql_lower.startswith("select"):
-                error = "Security Guard: Only SELECT queries are allowed."
-                audit_trail.append({"step": f"Attempt {attempt} Blocked", "detail": error})
-                continue
-                
-            forbidden = ["drop ", "delete ", "insert ", "update ", "truncate ", "alter "]
-            if any(f in sql_lower for f in forbidden):
-                error = "Security Guard: Destructive operations are not allowed."
-                audit_trail.append({"step": f"Attempt {attempt} Blocked", "detail": error})
-                continue
-                
-            result, error = self.db.execute_query(sql)
-            if error:
-                audit_trail.append({"step": f"Attempt {attempt} Failed", "detail": error})
-                continue
-            
-            audit_trail.append({"step": f"Attempt {attempt} Success", "detail": "Query executed successfully."})
-            break
-            
+        attempt = 0
+        # Speculative first attempt: the first candidate that validates is executed
+        if self.candidates > 1 and has_api_key():
+            attempt = 1
+            sql, result, error = self._speculate(question, schema_context, audit_trail)
+
+        if result is None and error != "UNANSWERABLE":
+            for attempt in range(attempt + 1, self.max_retries + 1):
+                sql = self.qe.generate_sql(question, schema_context, previous_error=error, previous_sql=sql)
+                audit_trail.append({"step": f"Attempt {attempt}", "detail": f"Generated SQL: {sql}"})
+
+                if sql.strip() == "UNANSWERABLE":
+                    error = "UNANSWERABLE"
+                    break
+
+                result, error = self._run(sql, f"Attempt {attempt}", audit_trail)
+                if error is None:
+                    break
+
         return {
             "sql": sql,
             "result": result,
@@ -53,3 +55,70 @@ class QueryValidator:
             "attempts": attempt,
             "relevant_columns": relevant_cols
         }
+
+    def _guard(self, sql):
+        sql_lower = sql.lower().strip()
+        if not sql_lower.startswith("select"):
+            return "Security Guard: Only SELECT queries are allowed."
+        if any(f in sql_lower for f in FORBIDDEN_KEYWORDS):
+            return "Security Guard: Destructive operations are not allowed."
+        return None
+
+    def _run(self, sql, label, audit_trail):
+        """Guard, validate and execute one SQL string; returns (result, error).
+
+        SQL that DuckDB cannot parse or bind is rejected before it executes.
+        """
+        error = self._guard(sql)
+        if error:
+            audit_trail.append({"step": f"{label} Blocked", "detail": error})
+            return None, error
+
+        error = self.db.validate_sql(sql)
+        if error:
+            audit_trail.append({"step": f"{label} Rejected", "detail": f"Failed validation before execution: {error}"})
+            return None, error
+
+        result, error = self.db.execute_query(sql)
+        if error:
+            audit_trail.append({"step": f"{label} Failed", "detail": error})
+            return None, error
+
+        audit_trail.append({"step": f"{label} Success", "detail": "Query executed successfully."})
+        return result, None
+
+    def _speculate(self, question, schema_context, audit_trail):
+        """Request several candidate SQLs at once and execute the first that validates.
+
+        Candidates are checked in the order they arrive. Returns (sql, result,
+        error); when none succeeds, the last candidate and its error seed the
+        repair loop.
+        """
+        futures = {
+            CANDIDATE_POOL.submit(self.qe.generate_sql, question, schema_context, temperature=temperature): n
+            for n, temperature in enumerate(CANDIDATE_TEMPERATURES[:self.candidates], 1)
+        }
+        sql, error, tried = None, None, set()
+        for future in as_completed(futures):
+            label = f"Candidate {futures[future]}"
+            try:
+                candidate = future.result()
+            except Exception as e:
+                audit_trail.append({"step": f"{label} Failed", "detail": f"Generation failed: {e}"})
+                continue
+            audit_trail.append({"step": label, "detail": f"Generated SQL: {candidate}"})
+            if candidate in tried:
+                continue
+            tried.add(candidate)
+            if candidate.strip() == "UNANSWERABLE":
+                # Only final if every candidate says so
+                sql, error = sql or candidate, error or "UNANSWERABLE"
+                continue
+
+            result, run_error = self._run(candidate, label, audit_trail)
+            sql, error = candidate, run_error
+            if run_error is None:
+                for pending in futures:
+                    pending.cancel()
+                return sql, result, None
+        return sql, None, error
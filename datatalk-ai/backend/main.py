@@ -8,6 +8,13 @@ from routes.upload import router as upload_router
 from routes.query import router as query_router
 from routes.export import router as export_router
 from routes.session import router as session_router
+from core.nvidia_client import close_clients
+from core.llm_cache import llm_cache
+from core.dataset_cache import dataset_cache
+from core.plan_cache import plan_cache
+from core.resource_governor import governor
+from routes.upload import ACTIVE_SESSIONS, UploadSizeLimit
+from core.session_store import session_store
 
 app = FastAPI(
     title="DataTalk AI",
@@ -23,12 +30,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(UploadSizeLimit)
+
 app.include_router(upload_router, tags=["Upload"])
 app.include_router(query_router, tags=["Query"])
 app.include_router(export_router, tags=["Export"])
 app.include_router(session_router, prefix="/session", tags=["Session"])
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    await close_clients()
+
+
 @app.get("/")
 def root():
     return {
@@ -38,6 +52,10 @@ def root():
         "endpoints": {
             "upload": "POST /upload",
             "query": "POST /query",
+            "query_stream": "POST /query/stream",
+            "query_batch": "POST /query/batch",
+            "query_batch_stream": "POST /query/batch/stream",
+            "query_rows": "GET /query/{session_id}/{query_id}/rows",
             "export_json": "GET /export/json/{session_id}",
             "export_sql": "GET /export/sql/{session_id}",
             "export_pdf": "GET /export/pdf/{session_id}",
@@ -50,4 +68,23 @@ def root():
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+@app.get("/health/cache")
+def cache_stats():
+    return {
+        "datasets": dataset_cache.stats(),
+        "llm": llm_cache.stats() if llm_cache else None,
+        "plans": plan_cache.stats() if plan_cache else None,
+    }
+
+
+@app.get("/health/resources")
+def resource_stats():
+    return governor.stats()
+
+
+@app.get("/health/sessions")
+def session_stats():
+    return {**ACTIVE_SESSIONS.stats(), "store": session_store.stats()}
@@ -9,3 +9,9 @@ class QueryRequest(BaseModel):
     @property
     def question(self):
         return self.query
+
+
+class BatchQueryRequest(BaseModel):
+    session_id: str = Field(..., description="Unique ID for the current dataset session")
+    questions: List[str] = Field(..., description="Natural language questions, answered independently of each other")
+    include_optional: bool = Field(False, description="Also produce chart explanations and executive summaries per question")
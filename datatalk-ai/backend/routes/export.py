@@ -1,12 +1,14 @@
 import json
 import io
-import csv as csv_module
 from pathlib import Path
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import Response, JSONResponse
+from fastapi.responses import Response, JSONResponse, FileResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import pandas as pd
-from routes.upload import load_sessions
+from routes.upload import get_active_session, ACTIVE_SESSIONS
+from routes.query import get_result_handle
 from core.report import ReportGenerator
+from core.session_store import session_store
 
 router = APIRouter()
 TEMP_DIR = Path("/tmp")
@@ -14,16 +16,18 @@ TEMP_DIR = Path("/tmp")
 
 @router.get("/export/json/{session_id}")
 async def export_json(session_id: str):
-    sessions = load_sessions()
-    if session_id not in sessions:
+    session = await run_in_threadpool(session_store.get, session_id)
+    if session is None:
         raise HTTPException(404, "Session not found")
 
-    session = sessions[session_id]
     filename = f"datatalk_{session_id}.json"
     filepath = TEMP_DIR / filename
 
-    with open(filepath, "w") as f:
-        json.dump(session, f, indent=2, default=str)
+    def write():
+        with open(filepath, "w") as f:
+            json.dump(session, f, indent=2, default=str)
+
+    await run_in_threadpool(write)
 
     return FileResponse(
         path=str(filepath),
@@ -34,11 +38,10 @@ async def export_json(session_id: str):
 
 @router.get("/export/sql/{session_id}")
 async def export_sql(session_id: str):
-    sessions = load_sessions()
-    if session_id not in sessions:
+    session = await run_in_threadpool(session_store.get, session_id)
+    if session is None:
         raise HTTPException(404, "Session not found")
 
-    session = sessions[session_id]
     history = session.get("query_history", [])
 
     lines = [
@@ -68,27 +71,17 @@ async def export_sql(session_id: str):
 
 @router.get("/export/csv/{session_id}/{query_id}")
 async def export_csv(session_id: str, query_id: str):
-    sessions = load_sessions()
-    if session_id not in sessions:
-        raise HTTPException(404, "Session not found")
-
-    history = sessions[session_id].get("query_history", [])
-    query = next((q for q in history if q.get("query_id") == query_id), None)
-
-    if not query:
-        raise HTTPException(404, "Query not found")
-
-    result = query.get("result", [])
-    if not result:
-        raise HTTPException(400, "No result data for this query")
+    """The full result of an answered query as CSV, streamed batch by batch (not capped like /query)."""
+    session = await run_in_threadpool(get_active_session, session_id)
+    handle = await run_in_threadpool(get_result_handle, session_id, session, query_id)
 
-    output = io.StringIO()
-    writer = csv_module.DictWriter(output, fieldnames=result[0].keys())
-    writer.writeheader()
-    writer.writerows(result)
+    def stream():
+        # stream_csv holds no query slot, so keep the session from being evicted mid-download
+        with ACTIVE_SESSIONS.pinned(session_id):
+            yield from session["db"].stream_csv(handle["sql"], handle["params"])
 
     return StreamingResponse(
-        io.StringIO(output.getvalue()),
+        stream(),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename=result_{query_id}.csv"}
     )
@@ -96,16 +89,15 @@ async def export_csv(session_id: str, query_id: str):
 
 @router.get("/export/pdf/{session_id}")
 async def export_pdf(session_id: str):
-    sessions = load_sessions()
-    if session_id not in sessions:
+    session = await run_in_threadpool(session_store.get, session_id)
+    if session is None:
         raise HTTPException(404, "Session not found")
 
-    session = sessions[session_id]
     filename = f"datatalk_{session_id}.pdf"
     filepath = str(TEMP_DIR / filename)
 
     rg = ReportGenerator()
-    rg.generate(session, filepath)
+    await run_in_threadpool(rg.generate, session, filepath)
 
     return FileResponse(
         path=filepath,
@@ -116,7 +108,7 @@ async def export_pdf(session_id: str):
 
 @router.get("/session/{session_id}")
 async def get_session(session_id: str):
-    sessions = load_sessions()
-    if session_id not in sessions:
+    session = await run_in_threadpool(session_store.get, session_id)
+    if session is None:
         raise HTTPException(404, "Session not found")
-    return sessions[session_id]
+    return session
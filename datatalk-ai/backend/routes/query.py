@@ -1,98 +1,335 @@
+import os
+import json
 import uuid
+import base64
+import asyncio
+import threading
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
-from models.request_models import QueryRequest
-from routes.upload import get_active_session, load_sessions, save_sessions
+from typing import Optional
+from collections import OrderedDict
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from models.request_models import QueryRequest, BatchQueryRequest
+from routes.upload import get_active_session
 from core.stats_engine import StatsEngine
 from core.anomaly import AnomalyDetector
 from core.answer_grounder import AnswerGrounder
 from core.executive_summary import ExecutiveSummaryEngine
+from core.stage_graph import Stage, StageGraph
+from core.plan_cache import plan_cache, canonical_question
+from core.rule_engine import RuleBasedSQLEngine, RULE_ENGINE_MIN_CONFIDENCE
+from core.resource_governor import run_interruptible
+from core.session_store import session_store
 
 router = APIRouter()
 
+# Per-stage time budgets for the query pipeline
+QUERY_LLM_TIMEOUT = float(os.getenv("QUERY_LLM_TIMEOUT", 30))
+QUERY_SQL_TIMEOUT = float(os.getenv("QUERY_SQL_TIMEOUT", 60))
+# Above this many concurrent queries the optional stages are skipped
+QUERY_SHED_THRESHOLD = int(os.getenv("QUERY_SHED_THRESHOLD", 8))
+OPTIONAL_QUERY_STAGES = ("visual_explanation", "auto_insights", "report")
+# Rows embedded in a /query response; the rest are paged via /query/{session}/{query}/rows
+RESULT_PAGE_ROWS = int(os.getenv("RESULT_PAGE_ROWS", 200))
+RESULT_PAGE_MAX_ROWS = int(os.getenv("RESULT_PAGE_MAX_ROWS", 5000))
+# Answered queries per session whose SQL is kept for paging and download
+RESULT_HANDLES_PER_SESSION = int(os.getenv("RESULT_HANDLES_PER_SESSION", 100))
+# Questions per /query/batch call, and how many of them are answered at once
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", 100))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+# How often a running /query checks whether its client is still connected
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", 0.5))
+
+
+class QueryLoad:
+    """Counts /query pipelines currently in flight."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.in_flight -= 1
+
+
+query_load = QueryLoad()
+
 stats_engine = StatsEngine()
 anomaly_detector = AnomalyDetector()
 answer_grounder = AnswerGrounder()
 exec_engine = ExecutiveSummaryEngine()
 
 
-@router.post("/query")
-async def query(req: QueryRequest):
-    try:
-        # 1. Get Session & Components
-        session = get_active_session(req.session_id)
-        intel_engine = session["intel_engine"]
-        discovery = session["discovery"]
-        db = session["db"]
+def get_rule_engine(session: dict) -> RuleBasedSQLEngine:
+    if "rule_engine" not in session:
+        session["rule_engine"] = RuleBasedSQLEngine(
+            session["analyzer"], session["intel_engine"].table, session["target_column"]
+        )
+    return session["rule_engine"]
 
-        # Update history
-        intel_engine.conversation_history = req.conversation_history or []
 
-        # === STEP 1: Intent Classification (Reasoning Layer) ===
-        mission = intel_engine.classify_intent(req.question)
+async def plan_question(req: QueryRequest, session: dict):
+    """Steps 1-2: a plan from the rule engine or the plan cache, else intent classification.
 
-        # === STEP 2: Multi-Query Expansion for Vague Queries ===
-        if mission.intent == "VAGUE_QUERY" and mission.expanded_queries:
-            # For vague queries, we return expansion options to the user
-            return {
-                "session_id": req.session_id,
-                "intent": "VAGUE_QUERY",
-                "expanded_queries": mission.expanded_queries,
-                "answer": "Your query is broad. Would you like to analyze any of these specific areas?",
-                "success": True
-            }
-
-        # === STEP 3: SQL Generation & Execution (Deterministic Layer) ===
-        sql = intel_engine.generate_sql(mission)
+    Returns (mission, plan). plan is None when the SQL still has to be
+    generated, otherwise a dict with the SQL to execute, its params, the
+    SQL to display and where it came from ("rules" or "cache").
+    """
+    intel_engine = session["intel_engine"]
+    # Update history
+    intel_engine.conversation_history = req.conversation_history or []
+
+    # Simple aggregations are answered deterministically, without an LLM round trip
+    rule_plan = get_rule_engine(session).translate(req.question, intel_engine.conversation_history)
+    if rule_plan and rule_plan.confidence >= RULE_ENGINE_MIN_CONFIDENCE:
+        return rule_plan.to_mission(), {
+            "sql": rule_plan.sql,
+            "params": rule_plan.params,
+            "display_sql": rule_plan.inline_sql(),
+            "source": "rules",
+            "confidence": rule_plan.confidence,
+        }
+
+    # A question already answered against an identically shaped table reuses its plan
+    cached_plan = plan_cache.get(
+        req.question, session["analyzer"].schema, intel_engine.table, intel_engine.conversation_history
+    ) if plan_cache else None
+    if cached_plan:
+        mission, sql = cached_plan
+        return mission, {"sql": sql, "params": None, "display_sql": sql, "source": "cache"}
+
+    # === STEP 1: Intent Classification (Reasoning Layer) ===
+    mission = await asyncio.wait_for(intel_engine.classify_intent_async(req.question), QUERY_LLM_TIMEOUT)
+    return mission, None
+
+
+def vague_response(req: QueryRequest, mission) -> dict:
+    # For vague queries, we return expansion options to the user
+    return {
+        "session_id": req.session_id,
+        "intent": "VAGUE_QUERY",
+        "expanded_queries": mission.expanded_queries,
+        "answer": "Your query is broad. Would you like to analyze any of these specific areas?",
+        "success": True
+    }
+
+
+def build_query_graph(req: QueryRequest, session: dict, mission, plan, on_token=None) -> StageGraph:
+    """Steps 3-7 as a stage graph: grounding, chart explanation and discovery only
+    need the SQL result, so they overlap; the executive summary waits for the answer.
+    With `on_token`, the grounded answer is streamed from the model as it is written."""
+    intel_engine, discovery, db = session["intel_engine"], session["discovery"], session["db"]
+    chart_type = mission.recommended_chart_type or "BarChart"
+    target_col = session["target_column"]
+
+    async def generate_sql():
+        if plan:
+            return plan["display_sql"]
+        sql = await intel_engine.generate_sql_async(mission)
         if sql == "UNSUPPORTED":
-             raise HTTPException(400, "Query outside the scope of current dataset.")
+            raise HTTPException(400, "Query outside the scope of current dataset.")
+        return sql
 
-        result_df, sql_error = db.execute_query(sql)
+    async def execute(sql):
+        # Cancelling this stage (timeout, failed sibling, client gone) interrupts the query in DuckDB
+        if plan:
+            result_df, sql_error = await run_interruptible(
+                db.execute_query, plan["sql"], plan["params"], timeout=QUERY_SQL_TIMEOUT)
+        else:
+            result_df, sql_error = await run_interruptible(db.execute_query, sql, timeout=QUERY_SQL_TIMEOUT)
         if sql_error:
-             raise HTTPException(400, f"SQL Execution Error: {sql_error}")
+            raise HTTPException(400, f"SQL Execution Error: {sql_error}")
+        return result_df
+
+    async def ground(sql, result):
+        if on_token is None:
+            return await intel_engine.ground_answer_async(req.question, result, sql)
+        return await intel_engine.ground_answer_stream_async(req.question, result, sql, on_token)
+
+    return StageGraph([
+        Stage("sql", generate_sql, timeout=QUERY_LLM_TIMEOUT),
+        Stage("result", execute, depends_on=["sql"], timeout=QUERY_SQL_TIMEOUT),
+        Stage("grounded", ground, depends_on=["sql", "result"], timeout=QUERY_LLM_TIMEOUT),
+        Stage("visual_explanation", lambda result: intel_engine.explain_chart_async(chart_type, result, req.question),
+              depends_on=["result"], timeout=QUERY_LLM_TIMEOUT, optional=True, default=""),
+        Stage("auto_insights", lambda: run_in_threadpool(
+                  discovery.categorical_insights, target_col, session["analyzer"].schema),
+              timeout=QUERY_LLM_TIMEOUT, optional=True, default=[]),
+        Stage("report", lambda grounded, result: intel_engine.generate_executive_report_async(
+                  req.question, grounded.answer, result),
+              depends_on=["grounded", "result"], timeout=QUERY_LLM_TIMEOUT, optional=True),
+    ])
+
+
+async def run_query_graph(graph: StageGraph, on_complete=None, skip=()) -> dict:
+    # Under load, optional stages are dropped so the answer itself stays fast
+    with query_load:
+        shed = OPTIONAL_QUERY_STAGES if query_load.in_flight > QUERY_SHED_THRESHOLD else ()
+        return await graph.run(skip=set(skip) | set(shed), on_complete=on_complete)
 
-        # === STEP 4: Grounded Explanation (Formatting Layer) ===
-        grounded = intel_engine.ground_answer(req.question, result_df, sql)
-        
-        # === STEP 5: Visual Interpretation & Selection ===
-        chart_type = mission.recommended_chart_type or "BarChart"
-        visual_explanation = intel_engine.explain_chart(chart_type, result_df, req.question)
 
-        # === STEP 6: AI-Driven Exploratory Insights (Discovery Agent) ===
-        target_col = session["analyzer"].schema.get("target_column")
-        extra_insights = discovery.discover_categorical_insights(target_col, session["analyzer"].schema)
+def result_rows(result_df) -> list:
+    return result_df.round(2).to_dict(orient="records") if not result_df.empty else []
 
-        # === STEP 7: Executive Summary (Strategic Layer) ===
-        report = intel_engine.generate_executive_report(req.question, grounded.answer, result_df)
 
-        # Cleanup data for response
-        result_data = result_df.round(2).to_dict(orient="records") if not result_df.empty else []
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(str(offset).encode()).decode().rstrip("=")
 
-        # Update Memory
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        offset = int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    if offset < 0:
+        raise HTTPException(400, "Invalid cursor")
+    return offset
+
+
+def remember_result(session: dict, query_id: str, sql: str, params=None):
+    """Keep the executed SQL so the query's rows can be paged and downloaded later."""
+    handles = session.setdefault("results", OrderedDict())
+    handles[query_id] = {"sql": sql, "params": params}
+    while len(handles) > RESULT_HANDLES_PER_SESSION:
+        handles.popitem(last=False)
+
+
+def get_result_handle(session_id: str, session: dict, query_id: str) -> dict:
+    """The SQL behind an answered query; handles dropped with an evicted session come back from the store."""
+    handle = session.get("results", {}).get(query_id)
+    if handle is None:
+        stored = session_store.result(session_id, query_id)
+        if stored is None:
+            raise HTTPException(404, "Query not found in this session")
+        remember_result(session, query_id, stored["sql"], stored["params"])
+        handle = session["results"][query_id]
+    return handle
+
+
+def first_page(result_df) -> dict:
+    """The rows embedded in a response, with a cursor for the next page when there are more."""
+    truncated = result_df.attrs.get("truncated", False)
+    more = truncated or len(result_df) > RESULT_PAGE_ROWS
+    return {
+        "result_data": result_rows(result_df.head(RESULT_PAGE_ROWS)),
+        "row_count": len(result_df),
+        "truncated": truncated,
+        "next_cursor": encode_cursor(RESULT_PAGE_ROWS) if more else None,
+    }
+
+
+def executive_summary(report) -> Optional[dict]:
+    return {
+        "summary": report.summary,
+        "risk_level": report.risk_level,
+        "business_impact": report.business_impact,
+        "priority_action": report.priority_action,
+        "statistical_confidence": report.statistical_confidence
+    } if report else None
+
+
+async def finish_query(req: QueryRequest, session: dict, mission, plan, graph: StageGraph, stages: dict,
+                       remember: bool = True) -> dict:
+    """Record the answered question and build the full /query response.
+
+    With `remember=False` the question stays out of the conversation
+    history and out of the stored history the exports read; its result can
+    still be paged and downloaded. Store writes run in the threadpool.
+    """
+    intel_engine = session["intel_engine"]
+    sql, result_df, grounded = stages["sql"], stages["result"], stages["grounded"]
+    if plan_cache and not plan:
+        await run_in_threadpool(plan_cache.put, req.question, session["analyzer"].schema, mission, sql,
+                                intel_engine.table, intel_engine.conversation_history)
+
+    # Update Memory
+    if remember:
         intel_engine.add_to_history(req.question, sql, grounded.answer)
 
-        return {
-            "session_id": req.session_id,
-            "query_id": str(uuid.uuid4())[:8],
-            "question": req.question,
+    query_id = str(uuid.uuid4())[:8]
+    result_sql, result_params = (plan["sql"], plan["params"]) if plan else (sql, None)
+    remember_result(session, query_id, result_sql, result_params)
+    # Paging and downloads read it back once the session was evicted
+    await run_in_threadpool(session_store.put_result, req.session_id, query_id, result_sql, result_params)
+
+    summary = executive_summary(stages["report"])
+    if remember:
+        # Read back by the JSON, SQL and PDF exports
+        await run_in_threadpool(session_store.append_history, req.session_id, {
+            "query_id": query_id,
+            "timestamp": datetime.now().isoformat(),
+            "user_question": req.question,
             "intent": mission.intent,
-            "answer": grounded.answer,
-            "recommendations": grounded.recommendations,
             "sql_executed": sql,
-            "result_data": result_data,
+            "answer": grounded.answer,
+            "executive_summary": summary,
             "row_count": len(result_df),
-            "chart_type": chart_type,
-            "visual_explanation": visual_explanation,
-            "executive_summary": {
-                "summary": report.summary,
-                "risk_level": report.risk_level,
-                "business_impact": report.business_impact,
-                "priority_action": report.priority_action,
-                "statistical_confidence": report.statistical_confidence
-            },
-            "auto_insights": extra_insights,
-            "success": True
-        }
+        })
+
+    return {
+        "session_id": req.session_id,
+        "query_id": query_id,
+        "question": req.question,
+        "intent": mission.intent,
+        "answer": grounded.answer,
+        "recommendations": grounded.recommendations,
+        "sql_executed": sql,
+        **first_page(result_df),
+        "download_url": f"/export/csv/{req.session_id}/{query_id}",
+        "chart_type": mission.recommended_chart_type or "BarChart",
+        "visual_explanation": stages["visual_explanation"],
+        "executive_summary": summary,
+        "auto_insights": stages["auto_insights"],
+        "stage_timings": graph.report,
+        "plan_source": plan["source"] if plan else "llm",
+        "plan_cache_hit": bool(plan) and plan["source"] == "cache",
+        "success": True
+    }
+
+
+async def cancel_on_disconnect(request: Request, coro):
+    """Await `coro`, cancelling it if the client closes the connection first."""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                return {"success": False, "error_message": "Client disconnected"}
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+@router.post("/query")
+async def query(req: QueryRequest, request: Request):
+    return await cancel_on_disconnect(request, answer_query(req))
+
+
+async def answer_query(req: QueryRequest):
+    try:
+        # 1. Get Session & Components
+        session = await run_in_threadpool(get_active_session, req.session_id)
+        mission, plan = await plan_question(req, session)
+
+        # === STEP 2: Multi-Query Expansion for Vague Queries ===
+        if mission.intent == "VAGUE_QUERY" and mission.expanded_queries:
+            return vague_response(req, mission)
+
+        graph = build_query_graph(req, session, mission, plan)
+        stages = await run_query_graph(graph)
+        return await finish_query(req, session, mission, plan, graph, stages)
 
     except Exception as e:
         import traceback
@@ -100,3 +337,216 @@ async def query(req: QueryRequest):
         return { "success": False, "error_message": str(e) }
 
 
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+# What each finished stage contributes to the event stream
+STAGE_EVENTS = {
+    "sql": lambda sql: ("sql", {"sql": sql}),
+    "result": lambda df: ("result", {"columns": list(df.columns), **first_page(df)}),
+    "grounded": lambda grounded: ("answer", {"answer": grounded.answer, "recommendations": grounded.recommendations}),
+    "visual_explanation": lambda text: ("visual_explanation", {"visual_explanation": text}),
+    "auto_insights": lambda insights: ("auto_insights", {"auto_insights": insights}),
+    "report": lambda report: ("executive_summary", {"executive_summary": executive_summary(report)}),
+}
+
+
+def sse_response(run) -> StreamingResponse:
+    """Stream the events `run(emit)` emits, ending with `error` if it raises.
+
+    `run` is cancelled when the client goes away mid-stream.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def pipeline():
+        try:
+            await run(events.put)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            await events.put(sse_event("error", {"success": False, "error_message": str(e)}))
+        finally:
+            await events.put(None)
+
+    async def stream():
+        task = asyncio.ensure_future(pipeline())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+        finally:
+            # The client went away mid-stream; stop any stages still running
+            task.cancel()
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.post("/query/stream")
+async def query_stream(req: QueryRequest):
+    """Server-Sent Events version of /query.
+
+    Emits `intent`, `sql`, `result`, `answer_token` (model chunks as they are
+    written), `answer`, `visual_explanation`, `auto_insights` and
+    `executive_summary` as each becomes available, then `done` carrying the
+    same body /query returns, or `error`.
+    """
+    async def run(emit):
+        async def on_token(token: str):
+            await emit(sse_event("answer_token", {"token": token}))
+
+        async def on_complete(name: str, result):
+            event, data = STAGE_EVENTS[name](result)
+            await emit(sse_event(event, data))
+
+        session = await run_in_threadpool(get_active_session, req.session_id)
+        mission, plan = await plan_question(req, session)
+        await emit(sse_event("intent", {
+            "intent": mission.intent,
+            "target_columns": mission.target_columns,
+            "chart_type": mission.recommended_chart_type or "BarChart",
+            "plan_source": plan["source"] if plan else "llm",
+        }))
+        if mission.intent == "VAGUE_QUERY" and mission.expanded_queries:
+            await emit(sse_event("done", vague_response(req, mission)))
+            return
+        graph = build_query_graph(req, session, mission, plan, on_token=on_token)
+        stages = await run_query_graph(graph, on_complete=on_complete)
+        await emit(sse_event("done", await finish_query(req, session, mission, plan, graph, stages)))
+
+    return sse_response(run)
+
+
+async def answer_batch_question(req: QueryRequest, session: dict, skip) -> dict:
+    """One batch question through the single-question pipeline; failures are reported, not raised."""
+    try:
+        mission, plan = await plan_question(req, session)
+        if mission.intent == "VAGUE_QUERY" and mission.expanded_queries:
+            return vague_response(req, mission)
+        graph = build_query_graph(req, session, mission, plan)
+        stages = await run_query_graph(graph, skip=skip)
+        result = await finish_query(req, session, mission, plan, graph, stages, remember=False)
+        # Insights do not depend on the question; the batch returns them once
+        result.pop("auto_insights", None)
+        return result
+    except Exception as e:
+        return {"session_id": req.session_id, "question": req.question, "success": False,
+                "error_message": e.detail if isinstance(e, HTTPException) else str(e)}
+
+
+async def run_batch(req: BatchQueryRequest, on_result=None) -> dict:
+    """Answer every question of a batch against one session.
+
+    Questions that are identical after canonicalization run once and share
+    the answer. Unique questions run at most BATCH_CONCURRENCY at a time;
+    the LLM client and the resource governor bound the stages further.
+    The schema context, the insight scan, rule plans, cached plans and
+    cached SQL results are shared by the whole batch. Batch questions are
+    answered independently and do not enter the conversation history or the
+    exported session history.
+    `on_result(result)` is awaited as each question's result is ready.
+    """
+    if not req.questions:
+        raise HTTPException(400, "No questions given.")
+    if len(req.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(400, f"A batch takes at most {BATCH_MAX_QUESTIONS} questions.")
+    session = await run_in_threadpool(get_active_session, req.session_id)
+    analyzer = session["analyzer"]
+
+    positions: "OrderedDict[str, list]" = OrderedDict()
+    for index, question in enumerate(req.questions):
+        positions.setdefault(canonical_question(question), []).append(index)
+
+    # Compile the schema context once up front instead of in the first few concurrent questions
+    await run_in_threadpool(analyzer.schema_context)
+    insights = asyncio.ensure_future(run_in_threadpool(
+        session["discovery"].categorical_insights, session["target_column"], analyzer.schema))
+    skip = {"auto_insights"} | (set() if req.include_optional else set(OPTIONAL_QUERY_STAGES))
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    results = [None] * len(req.questions)
+
+    async def answer(indices):
+        first = indices[0]
+        async with slots:
+            result = await answer_batch_question(
+                QueryRequest(session_id=req.session_id, query=req.questions[first]), session, skip)
+        for index in indices:
+            results[index] = {**result, "index": index, "question": req.questions[index],
+                              "duplicate_of": first if index != first else None}
+            if on_result is not None:
+                await on_result(results[index])
+
+    try:
+        await asyncio.gather(*(answer(indices) for indices in positions.values()))
+    except BaseException:
+        # Failed or cancelled batches do not wait for the scan; finished ones always collect it
+        insights.cancel()
+        raise
+    try:
+        auto_insights = await insights
+    except Exception as e:
+        print(f"[BatchQuery] Insight scan failed for {req.session_id}: {e}")
+        auto_insights = []
+
+    return {
+        "session_id": req.session_id,
+        "question_count": len(req.questions),
+        "unique_questions": len(positions),
+        "succeeded": sum(1 for r in results if r.get("success")),
+        "auto_insights": auto_insights,
+        "results": results,
+        "success": True,
+    }
+
+
+@router.post("/query/batch")
+async def query_batch(req: BatchQueryRequest, request: Request):
+    """Answer a list of questions against one session; `results` follows the order of `questions`."""
+    try:
+        return await cancel_on_disconnect(request, run_batch(req))
+    except HTTPException as e:
+        return {"success": False, "error_message": e.detail}
+
+
+@router.post("/query/batch/stream")
+async def query_batch_stream(req: BatchQueryRequest):
+    """Server-Sent Events version of /query/batch.
+
+    Emits a `result` event (with its `index` in `questions`) as each
+    question is answered, in completion order, then `done` with the batch
+    summary and auto-insights but without the results already sent, or `error`.
+    """
+    async def run(emit):
+        async def on_result(result):
+            await emit(sse_event("result", result))
+
+        summary = await run_batch(req, on_result=on_result)
+        summary.pop("results")
+        await emit(sse_event("done", summary))
+
+    return sse_response(run)
+
+
+@router.get("/query/{session_id}/{query_id}/rows")
+async def query_rows(session_id: str, query_id: str, cursor: Optional[str] = None, limit: int = RESULT_PAGE_ROWS):
+    """A page of an answered query's rows. Pass the returned `next_cursor` to get the following page."""
+    session = await run_in_threadpool(get_active_session, session_id)
+    handle = await run_in_threadpool(get_result_handle, session_id, session, query_id)
+    offset, limit = decode_cursor(cursor), max(1, min(limit, RESULT_PAGE_MAX_ROWS))
+    db = session["db"]
+    try:
+        table, more = await run_interruptible(db.fetch_page, handle["sql"], handle["params"], offset, limit)
+    except Exception as e:
+        raise HTTPException(400, f"SQL Execution Error: {e}")
+    page = db.to_frame(table)
+    return {
+        "session_id": session_id,
+        "query_id": query_id,
+        "columns": list(page.columns),
+        "rows": result_rows(page),
+        "offset": offset,
+        "next_cursor": encode_cursor(offset + limit) if more else None,
+    }
@@ -1,12 +1,13 @@
 from fastapi import APIRouter, HTTPException
-from routes.upload import load_sessions, get_active_session
+from fastapi.concurrency import run_in_threadpool
+from routes.upload import get_active_session
+from core.session_store import session_store
 
 router = APIRouter()
 
 @router.get("/{session_id}")
 async def get_session(session_id: str):
-    sessions = load_sessions()
-    session = sessions.get(session_id)
+    session = await run_in_threadpool(session_store.get, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
         
@@ -24,7 +25,7 @@ async def get_session(session_id: str):
 async def preview_session(session_id: str, limit: int = 100):
     """Return actual rows from the uploaded dataset, plus column-level stats."""
     try:
-        session = get_active_session(session_id)
+        session = await run_in_threadpool(get_active_session, session_id)
         db = session["db"]
 
         # Count total rows
@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+import pytest
+
+from models.request_models import BatchQueryRequest
+from routes import query
+
+
+class SlowDiscovery:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def categorical_insights(self, target_column, schema):
+        time.sleep(self.delay)
+        return [{"column": "contract", "target": target_column}]
+
+
+class Analyzer:
+    schema = {}
+
+    def schema_context(self):
+        return ""
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = {"analyzer": Analyzer(), "discovery": SlowDiscovery(0.3), "target_column": "churn"}
+    monkeypatch.setattr(query, "get_active_session", lambda session_id: session)
+    return session
+
+
+def test_questions_that_finish_before_the_insight_scan_still_get_insights(session, monkeypatch):
+    async def answer(req, session, skip):
+        return {"success": True, "answer": req.query}
+
+    monkeypatch.setattr(query, "answer_batch_question", answer)
+    req = BatchQueryRequest(session_id="s", questions=["a", "b", "a"])
+
+    result = asyncio.run(query.run_batch(req))
+
+    assert result["auto_insights"] == [{"column": "contract", "target": "churn"}]
+    assert [r["answer"] for r in result["results"]] == ["a", "b", "a"]
+    assert result["results"][2]["duplicate_of"] == 0
+
@@ -1,7 +1,7 @@
 import requests, json
+from core.session_store import session_store
 
-sessions = json.load(open("storage/sessions.json"))
-sid = list(sessions.keys())[-1]
+sid = session_store.latest()["session_id"]
 print(f"Session: {sid}")
 
 r = requests.post("http://localhost:8000/query", json={"session_id": sid, "query": "What is the churn rate by gender?"})
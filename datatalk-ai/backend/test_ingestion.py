@@ -0,0 +1,84 @@
+import gzip
+
+from core.ingestion import DataIngestion
+
+
+def _write_rows(f, sep, rows=30000, bad_row=29000):
+    # A non-numeric value past DuckDB's 20,480-row type sample makes its reader fail
+    f.write(sep.join(["id", "val", "qty"]) + "\n")
+    for i in range(rows):
+        f.write(sep.join([str(i), "n/a" if i == bad_row else str(i * 1.5), str(i % 7)]) + "\n")
+
+
+def test_pandas_reader_splits_tsv_on_tabs(tmp_path):
+    path = tmp_path / "data.tsv"
+    with open(path, "w") as f:
+        _write_rows(f, "\t")
+    schema, shape = DataIngestion().ingest_file(str(path), mode="pandas")
+    assert shape == (30000, 3)
+    assert list(schema) == ["id", "val", "qty"]
+
+
+def test_pandas_reader_decompresses_csv_gz(tmp_path):
+    path = tmp_path / "data.csv.gz"
+    with gzip.open(path, "wt") as f:
+        _write_rows(f, ",")
+    schema, shape = DataIngestion().ingest_file(str(path), mode="pandas")
+    assert shape == (30000, 3)
+
+
+def _no_pandas_fallback(monkeypatch):
+    def fail(self, file_path, table_name):
+        raise AssertionError("fell back to the pandas reader")
+    monkeypatch.setattr(DataIngestion, "_ingest_csv_pandas", fail)
+
+
+def test_native_reader_treats_pandas_missing_tokens_as_null(tmp_path, monkeypatch):
+    _no_pandas_fallback(monkeypatch)
+    path = tmp_path / "data.csv"
+    with open(path, "w") as f:
+        _write_rows(f, ",")
+    db = DataIngestion()
+    schema, shape = db.ingest_file(str(path))
+    assert shape == (30000, 3)
+    assert schema["val"]["type"] == "numeric"
+
+
+def test_native_reader_rescans_when_sampled_types_do_not_fit(tmp_path, monkeypatch):
+    _no_pandas_fallback(monkeypatch)
+    path = tmp_path / "data.csv"
+    with open(path, "w") as f:
+        f.write("id,val\n")
+        for i in range(30000):
+            f.write(f"{i},{'unknown' if i == 29000 else i}\n")
+    db = DataIngestion()
+    schema, shape = db.ingest_file(str(path))
+    assert shape == (30000, 2)
+    assert db.conn.execute("SELECT COUNT(*) FROM main_data WHERE val = 'unknown'").fetchone() == (1,)
+
+
+def test_queries_cannot_write_to_a_shared_dataset(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("id,val\n1,a\n2,b\n")
+    owner = DataIngestion(str(tmp_path / "data.duckdb"))
+    owner.ingest_file(str(path))
+    other = DataIngestion.restore(str(tmp_path / "data.duckdb"))
+    for sql in ("DELETE FROM main_data",
+                "WITH x AS (SELECT 1) DELETE FROM main_data",
+                "SELECT 1; DROP TABLE main_data",
+                "UPDATE main_data SET val = 'c'"):
+        result, error = other.execute_query(sql)
+        assert result is None and error
+    result, error = owner.execute_query("SELECT COUNT(*) AS n FROM main_data WHERE val <> 'c'")
+    assert error is None and result["n"].tolist() == [2]
+
+
+def test_writes_behind_a_cte_invalidate_cached_results(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("id,val\n1,a\n2,b\n")
+    db = DataIngestion()
+    db.ingest_file(str(path))
+    count = "SELECT COUNT(*) AS n FROM main_data"
+    assert db.query_arrow(count).to_pylist() == [{"n": 2}]
+    db.execute("WITH x AS (SELECT 1) DELETE FROM main_data WHERE id = 1")
+    assert db.query_arrow(count).to_pylist() == [{"n": 1}]
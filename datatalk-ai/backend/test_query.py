@@ -1,13 +1,12 @@
 import json, traceback, os
 os.environ.setdefault("ANTHROPIC_API_KEY", "")
 
-# Load a real session
-with open("storage/sessions.json") as f:
-    sessions = json.load(f)
+from core.session_store import session_store
 
-sid = list(sessions.keys())[-1]
+# Load a real session
+record = session_store.latest()
+sid = record["session_id"]
 print(f"Session: {sid}")
-record = sessions[sid]
 
 try:
     from core.ingestion import DataIngestion
@@ -0,0 +1,61 @@
+import threading
+
+import duckdb
+
+from core.ingestion import DataIngestion
+
+
+SPILLING_QUERY = (
+    "SELECT COUNT(*), SUM(h) FROM ("
+    " SELECT hash(i) AS h, i::VARCHAR || repeat('x', 40) AS s FROM range(3000000) t(i) ORDER BY s"
+    ")"
+)
+
+
+def _cache_entry(tmp_path, content_hash):
+    entry = tmp_path / content_hash
+    entry.mkdir()
+    return DataIngestion(str(entry / "data.duckdb"))
+
+
+def _temp_directory(db):
+    return db.cursor().execute("SELECT current_setting('temp_directory')").fetchone()[0]
+
+
+def test_cache_entries_spill_into_their_own_directories(tmp_path):
+    first, second = _cache_entry(tmp_path, "aaaa"), _cache_entry(tmp_path, "bbbb")
+    try:
+        assert _temp_directory(first) != _temp_directory(second)
+        assert "aaaa" in _temp_directory(first)
+    finally:
+        first.close()
+        second.close()
+
+
+def test_two_sessions_spill_concurrently(tmp_path):
+    databases = [_cache_entry(tmp_path, name) for name in ("aaaa", "bbbb")]
+    results, errors = {}, []
+
+    def run(db):
+        try:
+            cursor = db.cursor()
+            # Far below what the sort needs, so both databases spill at the same time
+            cursor.execute("SET memory_limit = '64MB'")
+            cursor.execute("SET preserve_insertion_order = false")
+            results[id(db)] = cursor.execute(SPILLING_QUERY).fetchone()
+        except duckdb.Error as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(db,)) for db in databases]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        for db in databases:
+            db.close()
+
+    assert not errors
+    expected = duckdb.connect().execute(SPILLING_QUERY).fetchone()
+    assert list(results.values()) == [expected, expected]
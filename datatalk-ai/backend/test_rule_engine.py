@@ -0,0 +1,123 @@
+import duckdb
+import pytest
+
+from core.rule_engine import RuleBasedSQLEngine, RULE_ENGINE_MIN_CONFIDENCE
+from core.schema_analyzer import SchemaAnalyzer
+
+
+def _categorical(*values):
+    return {"type": "categorical", "unique_values": list(values)}
+
+
+def _boolean():
+    return {"type": "boolean", "unique_values": ["No", "Yes"]}
+
+
+SCHEMA = {
+    "customerid": {"type": "id"},
+    "partner": _boolean(),
+    "seniorcitizen": _boolean(),
+    "phoneservice": _boolean(),
+    "multiplelines": _categorical("No", "Yes", "No phone service"),
+    "internetservice": _categorical("Fiber optic", "DSL", "No"),
+    "paymentmethod": _categorical("Electronic check", "Mailed check"),
+    "contract": _categorical("Month-to-month", "One year", "Two year"),
+    "tenure": {"type": "numeric"},
+    "monthlycharges": {"type": "numeric"},
+    "churn": _boolean(),
+}
+
+ROWS = [
+    # customerid, partner, seniorcitizen, phoneservice, multiplelines, internetservice, paymentmethod, contract,
+    # tenure, monthlycharges, churn
+    ("a", "Yes", "No", "Yes", "No", "DSL", "Mailed check", "One year", 10, 50.0, "No"),
+    ("b", "No", "No", "No", "No phone service", "DSL", "Electronic check", "Month-to-month", 2, 30.0, "Yes"),
+    ("c", "No", "Yes", "Yes", "Yes", "Fiber optic", "Electronic check", "Month-to-month", 5, 90.0, "Yes"),
+    ("d", "Yes", "No", "Yes", "No", "Fiber optic", "Mailed check", "Two year", 40, 80.0, "No"),
+]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return RuleBasedSQLEngine(SchemaAnalyzer(SCHEMA), target_column="churn")
+
+
+@pytest.fixture(scope="module")
+def conn():
+    conn = duckdb.connect()
+    conn.execute(
+        "CREATE TABLE main_data (customerid VARCHAR, partner VARCHAR, seniorcitizen VARCHAR, phoneservice VARCHAR, "
+        "multiplelines VARCHAR, internetservice VARCHAR, paymentmethod VARCHAR, contract VARCHAR, "
+        "tenure INTEGER, monthlycharges DOUBLE, churn VARCHAR)"
+    )
+    conn.executemany(f"INSERT INTO main_data VALUES ({', '.join('?' * 11)})", ROWS)
+    yield conn
+    conn.close()
+
+
+def run(conn, plan):
+    return conn.execute(plan.sql, plan.params).fetchall()
+
+
+def test_group_column_is_not_the_measure(engine, conn):
+    plan = engine.translate("top 5 payment methods by churn rate")
+    assert plan is not None
+    assert 'GROUP BY "paymentmethod"' in plan.sql
+    assert 'GROUP BY "churn"' not in plan.sql
+    assert dict((row[0], row[1]) for row in run(conn, plan)) == {"Electronic check": 100.0, "Mailed check": 0.0}
+
+
+def test_value_words_do_not_infer_boolean_filters(engine, conn):
+    plan = engine.translate("How many customers have no phone service?")
+    assert plan is not None
+    assert "phoneservice" not in plan.sql
+    assert plan.params == ["No phone service"]
+    assert run(conn, plan) == [(1,)]
+
+
+def test_percentage_of_a_value_is_a_share(engine, conn):
+    plan = engine.translate("What percentage of customers have DSL?")
+    assert plan is not None
+    assert plan.metric == "share"
+    assert "churn" not in plan.sql
+    assert run(conn, plan) == [(50.0, 2)]
+
+
+def test_percentage_that_names_the_target_is_its_rate(engine, conn):
+    plan = engine.translate("What percentage of DSL customers churned?")
+    assert plan is not None
+    assert plan.metric == "rate"
+    assert run(conn, plan) == [(50.0, 2)]
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("How many customers are without a partner?", 2),
+    ("How many customers are not senior citizens?", 3),
+    ("How many customers did not churn?", 2),
+])
+def test_negated_boolean_filters(engine, conn, question, expected):
+    plan = engine.translate(question)
+    assert plan is not None
+    assert "No" in plan.params
+    assert run(conn, plan) == [(expected,)]
+
+
+def test_negated_value_is_left_to_the_llm(engine):
+    assert engine.translate("What percentage of customers are not on fiber optic?") is None
+
+
+def test_total_of_an_unknown_measure_is_not_a_count(engine):
+    plan = engine.translate("What is the total revenue?")
+    assert plan is None or plan.confidence < RULE_ENGINE_MIN_CONFIDENCE
+
+
+def test_total_customers_is_a_count(engine, conn):
+    plan = engine.translate("total customers")
+    assert plan is not None
+    assert run(conn, plan) == [(4,)]
+
+
+def test_simple_questions_still_translate(engine, conn):
+    plan = engine.translate("What is the churn rate by contract?")
+    assert plan.confidence >= RULE_ENGINE_MIN_CONFIDENCE
+    assert sorted(run(conn, plan)) == [("Month-to-month", 100.0, 2), ("One year", 0.0, 1), ("Two year", 0.0, 1)]
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from core.session_manager import SessionManager
+from routes import upload
+
+
+class SlowDatabase:
+    """Stands in for DataIngestion: file-backed, with a close that takes a while."""
+
+    def __init__(self, name, close_seconds=0.0):
+        self.db_path = f"/sessions/{name}.duckdb"
+        self.close_seconds = close_seconds
+        self.closed = threading.Event()
+
+    def memory_usage(self):
+        return 1024
+
+    def close(self):
+        time.sleep(self.close_seconds)
+        self.closed.set()
+
+
+def _manager(**kwargs):
+    # Room for one session: inserting a second evicts the first
+    return SessionManager(spill_dir="/unused", max_sessions=1, min_idle=0, **kwargs)
+
+
+def test_lookups_do_not_wait_for_an_eviction():
+    sessions = _manager()
+    old = SlowDatabase("old", close_seconds=1.0)
+    sessions["old"] = {"db": old}
+    insert = threading.Thread(target=sessions.__setitem__, args=("new", {"db": SlowDatabase("new")}))
+    insert.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    assert "old" not in sessions
+    sessions.get("new")
+    assert time.monotonic() - started < 0.5
+    assert not old.closed.is_set()
+    insert.join()
+    assert old.closed.is_set()
+
+
+def test_a_session_is_restored_once_by_concurrent_lookups(monkeypatch):
+    sessions = SessionManager(spill_dir="/unused")
+    restores = []
+
+    def restore(session_id):
+        restores.append(session_id)
+        time.sleep(0.2)
+        session = {"db": SlowDatabase(session_id)}
+        sessions[session_id] = session
+        return session
+
+    monkeypatch.setattr(upload, "ACTIVE_SESSIONS", sessions)
+    monkeypatch.setattr(upload, "_restore_session", restore)
+    found = []
+    threads = [threading.Thread(target=lambda: found.append(upload.get_active_session("s"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert restores == ["s"]
+    assert len(found) == 8 and all(session is found[0] for session in found)
+
+
+def test_a_session_is_not_restored_while_it_is_being_evicted():
+    sessions = _manager()
+    old = SlowDatabase("old", close_seconds=0.5)
+    sessions["old"] = {"db": old}
+    insert = threading.Thread(target=sessions.__setitem__, args=("new", {"db": SlowDatabase("new")}))
+    insert.start()
+    time.sleep(0.1)
+    with sessions.lock("old"):
+        assert old.closed.is_set()
+    insert.join()
@@ -1,15 +1,50 @@
-from routes.upload import get_active_session
-import sys
+"""
+Benchmark: cold session restore (re-ingest the CSV) vs warm restore (reopen the session database).
+
+Usage: python test_session_restore.py [csv_path] [runs]
+"""
 import os
+import sys
+import time
+import shutil
+import tempfile
+import statistics
 
 # Add backend to path
-sys.path.append(os.getcwd())
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.ingestion import DataIngestion
+
+csv_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join("..", "datasets", "Telco Customer Churn.csv")
+runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+work_dir = tempfile.mkdtemp(prefix="datatalk_restore_")
+db_path = os.path.join(work_dir, "bench.duckdb")
 
-session_id = "40937de1" # One of the recent ones found
 try:
-    session = get_active_session(session_id)
-    print(f"SUCCESS: Loaded session {session_id}")
-    print(f"Keys: {list(session.keys())}")
-    print(f"Rows in main_data: {session['db'].execute('SELECT COUNT(*) FROM main_data').fetchone()[0]}")
+    cold_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        db = DataIngestion(db_path)
+        db.ingest_csv(csv_path)
+        cold_times.append(time.perf_counter() - start)
+        db.close()
+
+    warm_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        db = DataIngestion.restore(db_path)
+        rows = db.execute("SELECT COUNT(*) FROM main_data").fetchone()[0]
+        warm_times.append(time.perf_counter() - start)
+        assert db.get_schema(), "restored session is missing its schema"
+        db.close()
+
+    cold, warm = statistics.median(cold_times), statistics.median(warm_times)
+    print(f"Dataset: {csv_path} ({rows} rows, {os.path.getsize(db_path) / 1024 / 1024:.1f} MB on disk)")
+    print(f"Cold restore (ingest CSV):     median {cold * 1000:8.1f} ms over {runs} runs")
+    print(f"Warm restore (reopen DuckDB):  median {warm * 1000:8.1f} ms over {runs} runs")
+    print(f"Speedup: {cold / warm:.1f}x")
 except Exception as e:
     print(f"FAILED: {str(e)}")
+finally:
+    shutil.rmtree(work_dir, ignore_errors=True)
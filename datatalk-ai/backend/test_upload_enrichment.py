@@ -0,0 +1,57 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from core.upload_jobs import UploadJob
+from routes import upload
+
+
+class Database:
+    def get_sample_rows(self, n=5):
+        return pd.DataFrame({"tenure": [1, 2, 3], "churn": ["Yes", "No", "No"]})
+
+
+class Analyzer:
+    schema = {}
+    calls = 0
+
+    def generate_data_dictionary(self, timeout=None):
+        Analyzer.calls += 1
+        return {"tenure": "Months as a customer"}
+
+
+class Discovery:
+    def compute_impact_scores(self, schema, target_col):
+        return []
+
+    def categorical_insights(self, target_col, schema):
+        return []
+
+
+def test_llm_stages_that_never_get_a_worker_time_out(monkeypatch):
+    # One worker, held by another upload's call that outlives its own deadline
+    pool = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    pool.submit(release.wait)
+    monkeypatch.setattr(upload, "ENRICHMENT_POOL", pool)
+    monkeypatch.setattr(upload, "LLM_QUEUE_TIMEOUT", 0.2)
+    monkeypatch.setattr(upload, "update_session", lambda session_id, fields: None)
+    session = {"db": Database(), "analyzer": Analyzer(), "discovery": Discovery(),
+               "target_column": "churn", "shape": (3, 2)}
+    job = UploadJob("s")
+
+    started = time.monotonic()
+    try:
+        upload._run_upload_enrichment(session, "s", job, "hash")
+    finally:
+        release.set()
+        pool.shutdown(wait=True)
+
+    assert time.monotonic() - started < 2
+    stages = job.to_dict()["stages"]
+    assert stages["ai_summary"]["status"] == stages["data_dictionary"]["status"] == "failed"
+    assert stages["auto_insights"]["status"] == "done"
+    # The queued calls were dropped rather than run once the worker freed up
+    assert Analyzer.calls == 0
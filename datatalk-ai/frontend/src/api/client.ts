@@ -1,5 +1,14 @@
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
+// Keep in sync with FILE_FORMATS in backend/core/ingestion.py
+export const SUPPORTED_UPLOAD_EXTENSIONS = [
+    '.csv', '.tsv', '.csv.gz', '.csv.zst', '.parquet', '.pq',
+    '.arrow', '.feather', '.ipc', '.jsonl', '.ndjson',
+];
+
+export const isSupportedUpload = (fileName: string) =>
+    SUPPORTED_UPLOAD_EXTENSIONS.some(ext => fileName.toLowerCase().endsWith(ext));
+
 export const apiClient = {
     async get(path: string) {
         const response = await fetch(`${API_URL}${path}`);
@@ -22,6 +31,21 @@ export const apiClient = {
         return response.json();
     },
 
+    async getUploadStatus(sessionId: string) {
+        const response = await fetch(`${API_URL}/upload/${sessionId}/status`);
+        if (!response.ok) throw new Error("Upload status unavailable");
+        return response.json();
+    },
+
+    // Profiling, the data dictionary and insights finish in the background after /upload returns
+    async waitForUpload(sessionId: string, intervalMs = 1500) {
+        for (;;) {
+            const status = await this.getUploadStatus(sessionId);
+            if (status.status !== 'running') return status;
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    },
+
     async getSession(sessionId: string) {
         const response = await fetch(`${API_URL}/session/${sessionId}`);
         if (!response.ok) throw new Error("Session not found");
@@ -2,7 +2,7 @@ import * as React from 'react';
 import { useCallback, useState, useRef } from 'react';
 import { useSessionStore } from '../../store/sessionStore';
 import { useChatStore } from '../../store/chatStore';
-import { apiClient } from '../../api/client';
+import { apiClient, isSupportedUpload, SUPPORTED_UPLOAD_EXTENSIONS } from '../../api/client';
 import {
     Upload, FileText, BrainCircuit, ShieldCheck, BarChart3,
     Loader2, Rocket, CloudUpload, FileSpreadsheet, Database,
@@ -70,8 +70,8 @@ export const UploadPanel: React.FC = () => {
     }, []);
 
     const handleFile = async (file: File) => {
-        if (!file.name.endsWith('.csv')) {
-            setError("Analysis limited to CSV protocols.");
+        if (!isSupportedUpload(file.name)) {
+            setError("Supported formats: CSV (plain, gzip, zstd), Parquet, Arrow/Feather and JSON Lines.");
             return;
         }
 
@@ -88,6 +88,19 @@ export const UploadPanel: React.FC = () => {
                 response.target_column
             );
 
+            if (response.status === 'running') {
+                apiClient.waitForUpload(response.session_id)
+                    .then(status => useSessionStore.getState().sessionId === response.session_id && setSession(
+                        response.session_id,
+                        file.name,
+                        response.schema,
+                        status.result?.data_dictionary,
+                        status.result?.impact_scores,
+                        response.target_column
+                    ))
+                    .catch(() => { /* enrichment is optional; the session is already usable */ });
+            }
+
             setIsUploading(false);
             setIsAnalyzing(true);
 
@@ -203,7 +216,7 @@ export const UploadPanel: React.FC = () => {
                     <div className="flex items-center gap-4 mb-12">
                         <div className="h-px w-12 bg-border/60" />
                         <p className="text-xs text-muted font-black tracking-widest uppercase opacity-60">
-                            {isAnalyzing ? 'Mapping Correlations' : 'Awaiting CSV Input'}
+                            {isAnalyzing ? 'Mapping Correlations' : 'Awaiting Dataset Input'}
                         </p>
                         <div className="h-px w-12 bg-border/60" />
                     </div>
@@ -220,7 +233,7 @@ export const UploadPanel: React.FC = () => {
                                 type="file"
                                 id="file-upload"
                                 className="hidden"
-                                accept=".csv"
+                                accept={SUPPORTED_UPLOAD_EXTENSIONS.join(',')}
                                 onChange={(e) => e.target.files && handleFile(e.target.files[0])}
                                 disabled={isProcessing}
                             />
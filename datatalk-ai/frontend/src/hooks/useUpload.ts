@@ -1,6 +1,6 @@
 import { useCallback, useState } from 'react';
 import { useSessionStore } from '../store/sessionStore';
-import { apiClient } from '../api/client';
+import { apiClient, isSupportedUpload } from '../api/client';
 
 export function useUpload() {
     const setSession = useSessionStore(state => state.setSession);
@@ -8,8 +8,8 @@ export function useUpload() {
     const [error, setError] = useState<string | null>(null);
 
     const uploadFile = useCallback(async (file: File) => {
-        if (!file.name.endsWith('.csv')) {
-            setError('Please upload a valid CSV file.');
+        if (!isSupportedUpload(file.name)) {
+            setError('Please upload a CSV, Parquet, Arrow/Feather or JSON Lines file.');
             return;
         }
 